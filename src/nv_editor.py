@@ -41,7 +41,7 @@ class Plugin(PluginBase):
         Extends the superclass method.
         """
         super().install(model, view, controller)
-        self.editorService = EditorService(model, view, controller)
+        self._editorService = None
         self._icon = self._get_icon('editor.png')
 
         #--- Configure the user interface.
@@ -49,6 +49,12 @@ class Plugin(PluginBase):
         def open_editor_window(event=None):
             self.editorService.open_editor_window()
 
+        def open_chapter_window():
+            self.editorService.open_chapter_window()
+
+        def replace_in_project():
+            self.editorService.replace_in_project()
+
         # Add the Edit command to novelibre's Section menu.
         self._ui.sectionMenu.add_separator()
 
@@ -62,7 +68,18 @@ class Plugin(PluginBase):
         )
         self._ui.sectionMenu.disableOnLock.append(label)
 
+        # Add the Edit chapter command to novelibre's Section menu.
+        label = _('Edit chapter')
+        self._ui.sectionMenu.add_command(
+            label=label,
+            image=self._icon,
+            compound='left',
+            command=open_chapter_window,
+        )
+        self._ui.sectionMenu.disableOnLock.append(label)
+
         # Add the Edit command to novelibre's section context menu.
+        label = _('Edit')
         self._ui.sectionContextMenu.add_separator()
         self._ui.sectionContextMenu.add_command(
             label=label,
@@ -73,14 +90,41 @@ class Plugin(PluginBase):
         )
         self._ui.sectionContextMenu.disableOnLock.append(label)
 
+        # Add the project-wide Find and replace command
+        # to novelibre's Section menu.
+        label = _('Find and replace in all sections')
+        self._ui.sectionMenu.add_command(
+            label=label,
+            command=replace_in_project,
+        )
+        self._ui.sectionMenu.disableOnLock.append(label)
+
         self._add_help_menu_entry(_('Editor plugin help'))
 
         # Hotkey to start the section editor.
         self._ui.tv.tree.bind(KEYS.START_EDITOR[0], open_editor_window)
 
+    @property
+    def editorService(self):
+        """The editor service, created when first needed.
+        
+        Creating the service reads the configuration
+        and loads the icon and the fonts,
+        so this is deferred until an editor is opened.
+        """
+        if self._editorService is None:
+            self._editorService = EditorService(
+                self._mdl,
+                self._ui,
+                self._ctrl,
+            )
+        return self._editorService
+
     def on_close(self, event=None):
-        self.editorService.on_close()
+        if self._editorService is not None:
+            self._editorService.on_close()
 
     def on_quit(self, event=None):
-        self.editorService.on_quit()
+        if self._editorService is not None:
+            self._editorService.on_quit()
 
@@ -0,0 +1,577 @@
+"""Provide a class for the novelibre chapter editor window.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+from tkinter import ttk
+
+from nveditor.editor_box import EditorBox
+from nveditor.editor_view import EditorView
+from nveditor.find_dialog import FindDialog
+from nveditor.nveditor_globals import FEATURE
+from nveditor.nveditor_globals import HELP_PAGE
+from nveditor.nveditor_globals import prefs
+from nveditor.nveditor_locale import _
+from nveditor.platform.platform_settings import KEYS
+from nveditor.xml_validator import XmlValidator
+from nvlib.controller.sub_controller import SubController
+import tkinter as tk
+
+
+class ChapterView(tk.Toplevel, SubController):
+    """A pop-up window editing the sections of a chapter as one text.
+
+    Public instance methods:
+        get_changed_texts() -- Return the texts of the changed sections.
+        has_changed(scId) -- Return True if there are unapplied changes.
+        lift() -- Bring window to the foreground
+                  and set the focus to the editor box.
+        load_section(scId) -- Reload a section's text from the project.
+        on_quit() -- Exit the editor. Apply changes, if possible.
+        reset_changed() -- Consider the current text as unchanged.
+
+    Each section begins with a header line showing the section title.
+    A text mark at the header delimits the section.
+    The section texts are loaded when scrolled near the viewport,
+    and unloaded when scrolled far away, if unchanged.
+    Only sections whose text has changed are written back.
+    """
+    _MARK_PREFIX = 'section:'
+    _VIEW_TOP = 'viewTop'
+    # Mark keeping the view in place when loading sections above.
+    _MARGIN_SECTIONS = 1
+    # Sections above and below the viewport, loaded in advance.
+    _KEPT_SECTIONS = 5
+    # Sections above and below the viewport, not unloaded.
+
+    def __init__(self, model, view, controller, chId, service, icon=None):
+        self._mdl = model
+        self._ui = view
+        self._ctrl = controller
+        self._chId = chId
+        self._service = service
+        self._findDialog = None
+        self._loadJob = None
+
+        self._scIds = []
+        for scId in self._mdl.novel.tree.get_children(chId):
+            if self._mdl.novel.sections[scId].scType <= 1:
+                self._scIds.append(scId)
+        self._loadedContents = {}
+        # section contents at loading time
+        # key: str -- Section ID
+        # value: str -- section content
+        self._headers = []
+        # section title labels embedded in the text
+
+        # Create an independent editor window.
+        super().__init__()
+        self.geometry(prefs['win_geometry'])
+        if icon:
+            self.iconphoto(False, icon)
+        self.title(
+            f'{self._mdl.novel.chapters[chId].title}'
+            f' - {self._mdl.novel.title}'
+        )
+
+        # Add a main menu bar to the editor window.
+        self._mainMenu = tk.Menu(self)
+        self.config(menu=self._mainMenu)
+
+        # Add a text editor with scrollbar to the editor window.
+        self._sectionEditor = EditorBox(
+            self,
+            wrap='word',
+            undo=True,
+            spacing1=prefs['paragraph_spacing'],
+            spacing2=prefs['line_spacing'],
+            padx=prefs['margin_x'],
+            pady=prefs['margin_y'],
+        )
+        self._sectionEditor.pack(expand=True, fill='both')
+        self._sectionEditor.pack_propagate(0)
+        self._sectionEditor.add_scroll_listener(self._schedule_loading)
+
+        # Add a status bar to the editor window.
+        self._statusBar = tk.Label(self, text='', anchor='w', padx=5, pady=2)
+        self._statusBar.pack(expand=False, side='left')
+
+        # Add buttons to the bottom line.
+        ttk.Button(
+            self,
+            text=_('Close'),
+            command=self._request_closing,
+        ).pack(side='right')
+        ttk.Button(
+            self,
+            text=_('Apply changes'),
+            command=self._apply_changes,
+        ).pack(side='right')
+
+        #--- Configure the user interface.
+
+        # Add a "Chapter" Submenu to the editor window.
+        self._chapterMenu = tk.Menu(self._mainMenu, tearoff=0)
+        self._mainMenu.add_cascade(
+            label=_('Chapter'),
+            menu=self._chapterMenu,
+        )
+        self._chapterMenu.add_command(
+            label=_('Apply changes'),
+            accelerator=KEYS.APPLY_CHANGES[1],
+            command=self._apply_changes,
+        )
+        self._chapterMenu.add_command(
+            label=_('Close'),
+            accelerator=KEYS.QUIT_PROGRAM[1],
+            command=self._request_closing,
+        )
+
+        # Add a "View" Submenu to the editor window.
+        self._viewMenu = tk.Menu(self._mainMenu, tearoff=0)
+        self._mainMenu.add_cascade(
+            label=_('View'),
+            menu=self._viewMenu,
+        )
+        for i, cm in enumerate(EditorView.COLOR_MODES):
+            self._viewMenu.add_radiobutton(
+                label=cm[0],
+                variable=EditorView.colorModeVar,
+                command=self._change_editor_colors,
+                value=i,
+            )
+        self._viewMenu.add_separator()
+        self._viewMenu.add_command(
+            label=_('Increase font size'),
+            command=lambda: self._service.change_font_size(1),
+        )
+        self._viewMenu.add_command(
+            label=_('Decrease font size'),
+            command=lambda: self._service.change_font_size(-1),
+        )
+
+        # Add an "Edit" Submenu to the editor window.
+        self._editMenu = tk.Menu(self._mainMenu, tearoff=0)
+        self._mainMenu.add_cascade(
+            label=_('Edit'),
+            menu=self._editMenu,
+        )
+        self._editMenu.add_command(
+            label=_('Cut'), accelerator=KEYS.CUT[1],
+            command=lambda: self._sectionEditor.event_generate("<<Cut>>"),
+        )
+        self._editMenu.add_command(
+            label=_('Copy'),
+            accelerator=KEYS.COPY[1],
+            command=lambda: self._sectionEditor.event_generate("<<Copy>>"),
+        )
+        self._editMenu.add_command(
+            label=_('Paste'),
+            accelerator=KEYS.PASTE[1],
+            command=lambda: self._sectionEditor.event_generate("<<Paste>>"),
+        )
+        self._editMenu.add_separator()
+        self._editMenu.add_command(
+            label=_('Find and replace'),
+            accelerator=KEYS.FIND[1],
+            command=self._open_find_dialog,
+        )
+
+        # Add a "Format" Submenu to the editor window.
+        self._formatMenu = tk.Menu(self._mainMenu, tearoff=0)
+        self._mainMenu.add_cascade(
+            label=_('Format'),
+            menu=self._formatMenu,
+        )
+        self._formatMenu.add_command(
+            label=_('Emphasis'),
+            accelerator=KEYS.ITALIC[1],
+            command=self._sectionEditor.emphasis,
+        )
+        self._formatMenu.add_command(
+            label=_('Strong emphasis'),
+            accelerator=KEYS.BOLD[1],
+            command=self._sectionEditor.strong_emphasis,
+        )
+        self._formatMenu.add_command(
+            label=_('Plain'),
+            accelerator=KEYS.PLAIN[1],
+            command=self._sectionEditor.plain,
+        )
+
+        # Help
+        self._mainMenu.add_command(
+            label=_('Help'),
+            command=self._open_help,
+        )
+
+        #--- Key bindings.
+        keyBindings = [
+            (KEYS.OPEN_HELP[0], self._open_help),
+            (KEYS.QUIT_PROGRAM[0], self._request_closing),
+            (KEYS.APPLY_CHANGES[0], self._apply_changes),
+            (KEYS.FIND[0], self._open_find_dialog),
+            (KEYS.ITALIC[0], self._sectionEditor.emphasis),
+            (KEYS.BOLD[0], self._sectionEditor.strong_emphasis),
+            (KEYS.PLAIN[0], self._sectionEditor.plain),
+            ('<Return>', self._sectionEditor.new_paragraph),
+        ]
+        for key, callback in keyBindings:
+            self._sectionEditor.bind(key, callback)
+
+        self.protocol("WM_DELETE_WINDOW", self._request_closing)
+
+        # Set up the section headers; the texts are loaded when in view.
+        self._load_chapter()
+        self._set_editor_style()
+        self._service.resources.add_listener(self._set_editor_style)
+
+        self.lift()
+        self.update_idletasks()
+        self.geometry(prefs['win_geometry'])
+        self.isOpen = True
+
+    def destroy(self):
+        """Stop following the shared style, and destroy the window.
+        
+        Extends the superclass method.
+        """
+        self._service.resources.remove_listener(self._set_editor_style)
+        super().destroy()
+
+    def get_changed_texts(self):
+        """Return a dictionary with the texts of the changed sections.
+        
+        key: str -- Section ID.
+        value: (text, loadedContent) tuple -- The editor text
+               including the header line, and the section content
+               at loading time.
+        """
+        texts = {}
+        for i, scId in enumerate(self._scIds):
+            if not scId in self._loadedContents:
+                # Not loaded, thus unchanged.
+                continue
+
+            start, end = self._get_section_range(i)
+            text = self._sectionEditor.get(start, end)
+            loadedContent = self._loadedContents[scId]
+            if EditorBox.get_section_content(text) != loadedContent:
+                texts[scId] = (text, loadedContent)
+        return texts
+
+    def has_changed(self, scId=None):
+        """Return True if the text has unapplied changes.
+        
+        Optional arguments:
+            scId: str -- If given, check only this section's text.
+        """
+        if not self._sectionEditor.has_changed():
+            return False
+
+        if scId is None:
+            return True
+
+        if not scId in self._loadedContents:
+            return False
+
+        start, end = self._get_section_range(self._scIds.index(scId))
+        text = self._sectionEditor.get(start, end)
+        return EditorBox.get_section_content(text) != self._loadedContents[scId]
+
+    def lift(self):
+        """Bring window to the foreground and set the focus to the editor box.
+
+        Extends the superclass method.
+        """
+        if self.state() == 'iconic':
+            self.state('normal')
+        super().lift()
+        self._sectionEditor.focus()
+
+    def load_section(self, scId):
+        """Reload a section's text from the project, if already loaded.
+        
+        Positional arguments:
+            scId: str -- Section ID.
+        
+        Changes of the section's text in the window are discarded.
+        """
+        if not scId in self._loadedContents:
+            return
+
+        i = self._scIds.index(scId)
+        start, end = self._get_section_range(i)
+        content = self._mdl.novel.sections[scId].sectionContent
+        displayText, __ = EditorBox.prepare_text(content, withTags=False)
+        self._sectionEditor.load_text(
+            f'{int(start.split(".")[0]) + 1}.0',
+            displayText,
+            end,
+        )
+        self._loadedContents[scId] = content
+
+    def on_quit(self, event=None):
+        """Exit the editor. Apply changes, if possible."""
+        if not self._apply_changes_after_asking():
+            return 'break'
+            # keeping the editor window open
+            # due to malformed XML to be fixed before saving
+
+        if self._loadJob is not None:
+            self.after_cancel(self._loadJob)
+            self._loadJob = None
+        prefs['win_geometry'] = self.winfo_geometry()
+        self.destroy()
+        self.isOpen = False
+
+    def reset_changed(self):
+        """Consider the current text as unchanged."""
+        self._sectionEditor.reset_changed()
+
+    def _apply_changes(self, event=None):
+        # Transfer the changed section texts to the project.
+        # Return False if the changes cannot be applied.
+        changes = self._get_changes()
+        if changes is None:
+            return False
+
+        if not changes:
+            self._sectionEditor.reset_changed()
+            return True
+
+        if self._ctrl.isLocked:
+            if not self._ui.ask_yes_no(
+                message=_('Unlock and apply changes?'),
+                detail=_('Cannot apply section changes as long as the project is locked.'),
+                title=FEATURE,
+                parent=self,
+            ):
+                self.lift()
+                return False
+
+            self._ctrl.unlock()
+        for scId, newContent in changes.items():
+            self._mdl.novel.sections[scId].sectionContent = newContent
+            self._loadedContents[scId] = newContent
+        self._sectionEditor.reset_changed()
+        self.lift()
+        return True
+
+    def _apply_changes_after_asking(self, event=None):
+        # Transfer the changed section texts to the project. Ask first.
+        # Return False if the window is to be kept open.
+        if not self._sectionEditor.has_changed():
+            return True
+
+        changes = self._get_changes(check=False)
+        if not changes:
+            return True
+
+        if not self._ui.ask_yes_no(
+            message=_('Apply section changes?'),
+            title=FEATURE,
+            parent=self
+        ):
+            return True
+
+        return self._apply_changes()
+
+    def _change_editor_colors(self):
+        self._service.set_color_mode(EditorView.colorModeVar.get())
+
+    def _get_changes(self, check=True):
+        # Return a dictionary with the changed section contents
+        # by section ID. Unless check is False, verify that the changes
+        # are well-formed and that the sections have not been changed
+        # elsewhere. If not, notify the user and return None.
+        changes = {}
+        for scId, (text, loadedContent) in self.get_changed_texts().items():
+            if not scId in self._mdl.novel.sections:
+                # Deleted in the meantime.
+                continue
+
+            newContent = EditorBox.get_section_content(text)
+            section = self._mdl.novel.sections[scId]
+            if check:
+                if section.sectionContent != loadedContent:
+                    self._ui.show_error(
+                        message=_('Cannot apply section changes'),
+                        detail=(
+                            f'{section.title}: '
+                            f'{_("The section has been changed elsewhere")}.'
+                        ),
+                        parent=self,
+                    )
+                    self.lift()
+                    return None
+
+                error = XmlValidator.get_parse_error([text])
+                if error is not None:
+                    issue, lineNumber, column = error
+                    start = self._sectionEditor.index(self._get_mark(scId))
+                    lineNumber += int(start.split('.')[0]) - 1
+                    self._sectionEditor.mark_set(
+                        'insert',
+                        f'{lineNumber}.{column}',
+                    )
+                    self._sectionEditor.see('insert')
+                    self._ui.show_error(
+                        message=_('Invalid changes'),
+                        detail=(
+                            f'{section.title}: {issue}:'
+                            f' line {lineNumber} column {column}'
+                        ),
+                        parent=self,
+                    )
+                    self.lift()
+                    return None
+
+            changes[scId] = newContent
+        return changes
+
+    def _get_mark(self, scId):
+        return f'{self._MARK_PREFIX}{scId}'
+
+    def _get_section_range(self, i):
+        # Return the start and end index of the i-th section's text,
+        # including its header line.
+        start = self._sectionEditor.index(self._get_mark(self._scIds[i]))
+        if i + 1 < len(self._scIds):
+            end = self._sectionEditor.index(self._get_mark(self._scIds[i + 1]))
+        else:
+            end = self._sectionEditor.index('end')
+        return start, end
+
+    def _load_chapter(self):
+        # Insert a header for each section, and mark its position.
+        # Text inserted at a section mark moves the mark,
+        # so it belongs to the preceding section.
+        for scId in self._scIds:
+            start = self._sectionEditor.index('end-1c')
+            header = tk.Label(
+                self._sectionEditor,
+                text=self._mdl.novel.sections[scId].title,
+                anchor='w',
+                padx=5,
+            )
+            self._headers.append(header)
+            self._sectionEditor.window_create('end', window=header)
+            self._sectionEditor.insert('end', '\n')
+            self._sectionEditor.mark_set(self._get_mark(scId), start)
+        self._sectionEditor.edit_reset()
+        self._sectionEditor.reset_changed()
+        self._sectionEditor.mark_set('insert', '1.0 lineend +1c')
+        self._load_sections()
+
+    def _load_section(self, i):
+        # Insert the text of the i-th section before the next header.
+        scId = self._scIds[i]
+        content = self._mdl.novel.sections[scId].sectionContent
+        __, end = self._get_section_range(i)
+        displayText, __ = EditorBox.prepare_text(content, withTags=False)
+        self._sectionEditor.load_text(end, displayText)
+        self._loadedContents[scId] = content
+
+    def _load_sections(self):
+        # Load the sections in view, and their neighbours.
+        self._loadJob = None
+        firstVisible = self._sectionEditor.index('@0,0')
+        lastVisible = self._sectionEditor.index(
+            f'@0,{self._sectionEditor.winfo_height()}'
+        )
+        firstLine = int(firstVisible.split('.')[0])
+        lastLine = int(lastVisible.split('.')[0])
+        inView = []
+        for i in range(len(self._scIds)):
+            start, end = self._get_section_range(i)
+            if int(start.split('.')[0]) > lastLine:
+                break
+
+            if int(end.split('.')[0]) >= firstLine:
+                inView.append(i)
+        if not inView:
+            return
+
+        pending = []
+        for i in range(
+            max(0, inView[0] - self._MARGIN_SECTIONS),
+            min(len(self._scIds), inView[-1] + self._MARGIN_SECTIONS + 1),
+        ):
+            if not self._scIds[i] in self._loadedContents:
+                pending.append(i)
+        distant = []
+        for scId in self._loadedContents:
+            i = self._scIds.index(scId)
+            if (i < inView[0] - self._KEPT_SECTIONS
+                or i > inView[-1] + self._KEPT_SECTIONS
+            ):
+                distant.append(i)
+        if not (pending or distant):
+            return
+
+        # Keep the view in place when loading or unloading sections above.
+        # Loading changes the view, so the loading is repeated
+        # until the sections in view are loaded.
+        self._sectionEditor.mark_set(self._VIEW_TOP, firstVisible)
+        for i in pending:
+            self._load_section(i)
+        for i in distant:
+            self._unload_section(i)
+        self._sectionEditor.yview(self._VIEW_TOP)
+
+    def _open_find_dialog(self, event=None):
+        # Open the find/replace dialog, or bring it to the foreground.
+        if self._findDialog is None or not self._findDialog.winfo_exists():
+            self._findDialog = FindDialog(self, self._sectionEditor)
+        else:
+            self._findDialog.lift()
+        if self._sectionEditor.tag_ranges('sel'):
+            selection = self._sectionEditor.get('sel.first', 'sel.last')
+            self._findDialog.set_search_term(selection.split('\n')[0])
+        return 'break'
+
+    def _open_help(self, event=None):
+        self._ctrl.open_help(page=HELP_PAGE)
+
+    def _request_closing(self, event=None):
+        self._service.close_chapter_window(self._chId)
+        # making sure the service removes this instance from the list
+
+    def _schedule_loading(self):
+        # Load the sections scrolled into view when idle,
+        # and unload the sections scrolled far away.
+        if self._loadJob is None:
+            self._loadJob = self.after_idle(self._load_sections)
+
+    def _set_editor_style(self):
+        style = self._service.resources.get_style()
+        self._sectionEditor.set_style(*style)
+        __, __, foreground, background, __ = style
+        for header in self._headers:
+            # Show the headers in inverted colors.
+            header['fg'] = background
+            header['bg'] = foreground
+
+    def _unload_section(self, i):
+        # Remove the text of the i-th section, leaving its header line.
+        # Keep the text if it has changed, if undo steps refer to it,
+        # or if it holds the insertion cursor.
+        scId = self._scIds[i]
+        start, end = self._get_section_range(i)
+        textStart = f'{int(start.split(".")[0]) + 1}.0'
+        if (self._sectionEditor.compare(textStart, '<=', 'insert')
+            and self._sectionEditor.compare('insert', '<', end)
+        ):
+            return
+
+        if self._sectionEditor.is_recorded(textStart, end):
+            return
+
+        text = self._sectionEditor.get(start, end)
+        if EditorBox.get_section_content(text) != self._loadedContents[scId]:
+            return
+
+        self._sectionEditor.load_text(textStart, '', end)
+        del self._loadedContents[scId]
@@ -0,0 +1,346 @@
+"""Provide a class for journaling the unapplied changes of the editors.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+from collections import deque
+import json
+import os
+from queue import Empty
+from queue import Full
+from queue import Queue
+from threading import Event
+from threading import Thread
+import zlib
+
+from nveditor.editor_box import EditorBox
+
+
+class EditJournal:
+    """Append the changes of the editor texts to a journal file.
+
+    Public instance variables:
+        filePath -- Path of the journal file.
+
+    Public methods:
+        add_recorder(recorder) -- Collect the changes of a recorder.
+        remove_recorder(recorder) -- Stop collecting a recorder's changes.
+        put(record) -- Queue a record for writing.
+        flush() -- Pass the collected changes to the writer thread.
+        is_ready() -- Return True if the lost sessions are known.
+        get_recovered_content(scId, sectionContent) -- Return the text
+                                                        of a lost session.
+        get_crc(sectionContent) -- Return a checksum of a section content.
+        close() -- Write the pending records and stop the writer.
+
+    The journal is a file of JSON lines, one record per line:
+        {"section": scId, "open": crc} -- The section was loaded.
+        {"section": scId, "applied": crc, "entry": deltas} -- The
+            section's changes were applied. The entry deltas turn
+            the applied section content into the editor text.
+        {"section": scId, "changes": deltas} -- The text was changed.
+        {"section": scId, "close": 1} -- The editor was closed.
+    The deltas are [firstLine, lastLine, newLines] lists,
+    as passed to the line listeners.
+    The crc is the checksum of the section content the following
+    deltas refer to. A session is recovered from the last such
+    content that matches the stored section content.
+    The file is appended by a background thread, so writing
+    does not block typing. The thread syncs the file to the disk
+    once per batch of records.
+    When opening the journal, the writer thread reduces it
+    to the sessions that can be recovered, before appending.
+    """
+    _QUEUE_SIZE = 100
+    # Maximum number of records waiting for the writer thread.
+    _BATCH_SIZE = 50
+    # Maximum number of records written per disk sync.
+
+    def __init__(self, filePath, sections):
+        """Open the journal, and start the writer thread.
+        
+        Positional arguments:
+            filePath: str -- Path of the journal file.
+            sections: dict -- The novel's sections by section ID.
+
+        The writer thread first reduces the journal
+        to the sessions that can be recovered.
+        """
+        self.filePath = filePath
+        self._recoverable = {}
+        # unclosed sessions of a previous run, by section ID
+        self._isReady = Event()
+        # set when the unclosed sessions are read
+        self._recorders = []
+        self._outbox = deque()
+        # records not yet accepted by the queue
+        self._queue = Queue(self._QUEUE_SIZE)
+        self._isBroken = False
+        sectionContents = {
+            scId: section.sectionContent for scId, section in sections.items()
+        }
+        self._writer = Thread(
+            target=self._write_records,
+            args=(sectionContents,),
+            daemon=True,
+        )
+        self._writer.start()
+
+    def add_recorder(self, recorder):
+        """Collect the changes of recorder when flushing."""
+        if recorder not in self._recorders:
+            self._recorders.append(recorder)
+
+    def remove_recorder(self, recorder):
+        """Stop collecting the changes of recorder."""
+        if recorder in self._recorders:
+            self._recorders.remove(recorder)
+
+    def put(self, record):
+        """Queue a record for writing, keeping the order of the records."""
+        if not self._isBroken:
+            self._outbox.append(record)
+
+    def flush(self):
+        """Pass the collected changes to the writer thread.
+
+        Do not wait if the queue is full;
+        the remaining records are passed with the next flush.
+        """
+        for recorder in self._recorders:
+            recorder.flush()
+        while self._outbox and not self._isBroken:
+            try:
+                self._queue.put_nowait(self._outbox[0])
+            except Full:
+                break
+
+            self._outbox.popleft()
+
+    def get_recovered_content(self, scId, sectionContent):
+        """Return the text of a lost editor session, if any.
+
+        Positional arguments:
+            scId: str -- Section ID.
+            sectionContent: str -- The section's stored content.
+
+        Return the section content as it was in the editor,
+        or None, if there is nothing to recover.
+        The session is only offered once.
+        Call this method only when is_ready() returns True.
+        """
+        session = self._recoverable.pop(scId, None)
+        if session is None:
+            return None
+
+        lines = self._rebuild(session, sectionContent)
+        if lines is None:
+            return None
+
+        return EditorBox.get_section_content('\n'.join(lines))
+
+    def is_ready(self):
+        """Return True if the lost sessions have been read."""
+        return self._isReady.is_set()
+
+    def close(self):
+        """Write the pending records and stop the writer thread.
+
+        Delete the journal file, if all sessions are closed,
+        and all lost sessions are offered.
+        """
+        hasRecorders = bool(self._recorders)
+        for recorder in self._recorders:
+            recorder.flush()
+        self._recorders.clear()
+        if self._isBroken:
+            self._outbox.clear()
+        self._outbox.append(None)
+        while self._outbox:
+            self._queue.put(self._outbox.popleft())
+        self._writer.join()
+        if not (hasRecorders or self._recoverable):
+            try:
+                os.remove(self.filePath)
+            except OSError:
+                pass
+
+    @staticmethod
+    def get_crc(sectionContent):
+        """Return a checksum of a section content."""
+        return zlib.crc32((sectionContent or '').encode('utf-8'))
+
+    @staticmethod
+    def get_delta(oldLines, newLines):
+        """Return a delta turning oldLines into newLines.
+        
+        The delta replaces the lines between the common
+        leading and trailing lines.
+        """
+        first = 0
+        maxFirst = min(len(oldLines), len(newLines))
+        while first < maxFirst and oldLines[first] == newLines[first]:
+            first += 1
+        last = 0
+        maxLast = maxFirst - first
+        while (last < maxLast
+               and oldLines[-1 - last] == newLines[-1 - last]
+        ):
+            last += 1
+        return [
+            first + 1,
+            len(oldLines) - last,
+            newLines[first:len(newLines) - last],
+        ]
+
+    def _compact(self, sessions, sectionContents):
+        # Rewrite the file with the recoverable sessions only.
+        # Replace the file at once, so as not to lose the journal
+        # in case of failure.
+        # Return the recoverable sessions.
+        recoverable = {}
+        records = []
+        for scId, session in sessions.items():
+            if not scId in sectionContents:
+                continue
+
+            sectionContent = sectionContents[scId]
+            lines = self._rebuild(session, sectionContent)
+            if lines is None:
+                continue
+
+            prepared = EditorBox.prepare_text(
+                sectionContent,
+                withTags=False,
+            )[0].split('\n')
+            crc = self.get_crc(sectionContent)
+            deltas = [self.get_delta(prepared, lines)]
+            recoverable[scId] = ([(crc, [], 0)], deltas)
+            records.append({'section': scId, 'open': crc})
+            records.append({'section': scId, 'changes': deltas})
+        if not recoverable:
+            try:
+                os.remove(self.filePath)
+            except OSError:
+                pass
+            return recoverable
+
+        tempPath = f'{self.filePath}.tmp'
+        try:
+            with open(tempPath, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(
+                        record,
+                        ensure_ascii=False,
+                        separators=(',', ':'),
+                    ))
+                    f.write('\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tempPath, self.filePath)
+        except OSError:
+            pass
+        return recoverable
+
+    def _read_sessions(self):
+        # Return a dictionary with the unclosed sessions in the file.
+        # key: section ID
+        # value: (points, deltas) tuple
+        #   points: list of (crc, entryDeltas, start) tuples;
+        #           the deltas from start apply to the content
+        #           with that crc, after the entry deltas.
+        #   deltas: list of the deltas since the session started.
+        sessions = {}
+        try:
+            with open(self.filePath, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        scId = record['section']
+                    except (ValueError, KeyError, TypeError):
+                        # Probably the crash truncated the last line.
+                        continue
+
+                    if 'open' in record:
+                        sessions[scId] = ([(record['open'], [], 0)], [])
+                    elif 'applied' in record and scId in sessions:
+                        points, deltas = sessions[scId]
+                        points.append((
+                            record['applied'],
+                            record.get('entry', []),
+                            len(deltas),
+                        ))
+                    elif 'changes' in record and scId in sessions:
+                        sessions[scId][1].extend(record['changes'])
+                    elif 'close' in record:
+                        sessions.pop(scId, None)
+        except OSError:
+            pass
+        return sessions
+
+    def _rebuild(self, session, sectionContent):
+        # Return the editor lines of a lost session,
+        # or None, if there is nothing to recover.
+        points, deltas = session
+        crc = self.get_crc(sectionContent)
+        for pointCrc, entryDeltas, start in reversed(points):
+            if pointCrc == crc:
+                break
+        else:
+            # The section was changed since the session started.
+            return None
+
+        lines = EditorBox.prepare_text(
+            sectionContent,
+            withTags=False,
+        )[0].split('\n')
+        for firstLine, lastLine, newLines in entryDeltas + deltas[start:]:
+            lines[firstLine - 1:lastLine] = newLines
+        content = EditorBox.get_section_content('\n'.join(lines))
+        if content == (sectionContent or ''):
+            return None
+
+        return lines
+
+    def _write_records(self, sectionContents):
+        # Reduce the file to the recoverable sessions, then
+        # append the queued records to the file until None is queued.
+        # Run in the writer thread.
+        try:
+            self._recoverable = self._compact(
+                self._read_sessions(),
+                sectionContents,
+            )
+        finally:
+            self._isReady.set()
+        isRunning = True
+        try:
+            os.makedirs(os.path.dirname(self.filePath), exist_ok=True)
+            with open(self.filePath, 'a', encoding='utf-8') as f:
+                while isRunning:
+                    records = [self._queue.get()]
+                    while len(records) < self._BATCH_SIZE:
+                        try:
+                            records.append(self._queue.get_nowait())
+                        except Empty:
+                            break
+
+                    for record in records:
+                        if record is None:
+                            isRunning = False
+                            break
+
+                        f.write(json.dumps(
+                            record,
+                            ensure_ascii=False,
+                            separators=(',', ':'),
+                        ))
+                        f.write('\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError:
+            # Journaling is not possible; discard the records.
+            self._isBroken = True
+            while isRunning:
+                isRunning = self._queue.get() is not None
@@ -4,43 +4,118 @@ Copyright (c) Peter Triesberger
 For further information see https://github.com/peter88213/nv_editor
 License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
 """
+from collections import deque
+from contextlib import contextmanager
 import re
-from tkinter import font as tkFont
 from tkinter import ttk
 
+from nveditor.match_index import MatchIndex
+from nveditor.tag_tokenizer import get_tag_indices
+from nveditor.tag_tokenizer import get_text_spans
+from nveditor.text_document import TextDocument
+from nveditor.xml_validator import XmlValidator
 from nvlib.model.xml.xml_filter import strip_illegal_characters
 import tkinter as tk
-import xml.etree.ElementTree as ET
 
 
 class EditorBox(tk.Text):
     """A text editor widget for novelibre raw markup."""
     _TAGS = ('em', 'strong')
     # Supported tags.
+    _FORMAT_TAG = re.compile(f"<(/?)({'|'.join(_TAGS)})>")
     XML_TAG = 'xmlTag'
+    SEARCH_TAG = 'searchHit'
+    _DIRTY_TAG = 'dirtyLines'
+    # Invisible tag marking the lines changed since the last colorizer pass.
+    _RANGE_FIRST = 'formatFirst'
+    _RANGE_LAST = 'formatLast'
+    # Marks delimiting the range being formatted.
+    _VIEW_TOP = 'windowViewTop'
+    # Mark keeping the view in place when moving the window.
+    _CHUNK_LINES = 100
+    # Maximum number of lines colorized without yielding to the event loop.
+    _MARGIN_LINES = 50
+    # Lines above and below the viewport colorized in lazy mode.
+    _PARSE_CHUNK_LINES = 1000
+    # Number of lines fed to the XML parser at once.
+    _SWAP_LINES = 200
+    # Lines moved into the widget at once when scrolling near its edges.
+    _MAX_LINE_LENGTH = 10000
+    # Longer lines are broken for display after a space outside the tags.
+
+    highlightDelay = 200
+    # Debounce interval for highlighting in milliseconds.
+    lazyHighlighting = False
+    # If True, colorize only the lines scrolled into view.
+    maxUndoSteps = 1000
+    # Maximum number of undo steps; 0 means unlimited.
+    maxUndoBytes = 8000000
+    # Maximum size of the text held by the undo steps; 0 means unlimited.
+    windowLines = 0
+    # Maximum number of lines loaded into the widget; 0 means unlimited.
+    # To be overwritten by the client.
 
     def __init__(self, master=None, **kw):
         """Copied from tkinter.scrolledtext and modified (use ttk widgets).
         
         Extends the supeclass constructor.
         """
+        self._highlightJob = None
+        # ID of the scheduled highlighting job
+
+        self._revision = 0
+        self._appliedRevision = 0
+        # for change detection without text comparison
+
+        self._lineCount = 1
+        self._document = TextDocument()
+        self._validator = XmlValidator()
+        self._matchIndex = MatchIndex()
+        self._lineListeners = [
+            self._document,
+            self._validator,
+            self._matchIndex,
+        ]
+        # objects with a replace_lines() method,
+        # to be notified when lines change
+
+        self._isUndoEnabled = kw.pop('undo', False)
+        self._undoSteps = deque()
+        # [size, changes] lists, the last one being the current step;
+        # size is the text size of the changes in bytes;
+        # changes is a list of (firstLine, oldLines, newLines) tuples
+        # with document line numbers, in the order of the changes
+        self._redoSteps = []
+        self._undoBytes = 0
+        self._undoAnchor = None
+        # (kind, index) where the last change left off;
+        # None, if the next change starts a new undo step
+        self._undoBlockLevel = 0
+        self._isUndoing = False
+        self._isLoading = False
+
+        self._scrollListeners = []
+        # functions to be called when the view is scrolled
+        self._changeListeners = []
+        # functions to be called when the text is changed
+
+        self._windowOffset = 0
+        # number of document lines above the widget's first line,
+        # if a large text is not completely loaded into the widget
+        self._windowJob = None
+
         self.frame = ttk.Frame(master)
         self.vbar = ttk.Scrollbar(self.frame)
         self.vbar.pack(side='right', fill='y')
 
-        kw.update({'yscrollcommand': self.vbar.set})
+        kw.update({'yscrollcommand': self._on_yscroll})
+        # Tk's undo mechanism is not used, because its undo steps
+        # refer to widget positions, which change when lines are moved
+        # in or out of the widget. See _edit().
         tk.Text.__init__(self, self.frame, **kw)
         self.pack(side='left', fill='both', expand=True)
         self.vbar['command'] = self.yview
 
-        defaultFont = tkFont.Font(
-            root=self,
-            font=kw['font'],
-            name='editor_font',
-        )
-        boldFont = tkFont.Font(**defaultFont.configure())
-        boldFont.configure(weight='bold')
-
         # Copy geometry methods of self.frame without overriding Text
         # methods -- hack!
         text_meths = vars(tk.Text).keys()
@@ -58,59 +133,484 @@ class EditorBox(tk.Text):
         self.tag_configure(
             self.XML_TAG,
             foreground='cornflower blue',
-            font=boldFont,
         )
+        self.tag_configure(
+            self.SEARCH_TAG,
+            background='gold',
+            foreground='black',
+        )
+        self.tag_lower(self.SEARCH_TAG, 'sel')
+
+        # Redirect the widget's Tcl command in order to track changes
+        # made by typing, pasting, undo/redo, or by the application.
+        self._origCommand = f'{self._w}_orig'
+        self.tk.call('rename', self._w, self._origCommand)
+        self.tk.createcommand(self._w, self._dispatch)
+
+    def add_change_listener(self, listener):
+        """Register a function to be called when the text is changed."""
+        self._changeListeners.append(listener)
+
+    def add_line_listener(self, listener):
+        """Register an object to be notified when lines change.
+        
+        Positional arguments:
+            listener -- An object with a replace_lines() method,
+                        initially holding one empty line.
+        
+        The listener is passed the whole text first.
+        The line numbers always refer to the whole text.
+        """
+        listener.replace_lines(1, 1, self._document.get_lines())
+        self._lineListeners.append(listener)
+
+    def add_scroll_listener(self, listener):
+        """Register a function to be called when the view is scrolled."""
+        self._scrollListeners.append(listener)
+
+    def can_split(self, index='insert'):
+        """Return True if splitting the text at index gives well-formed XML."""
+        position = self._get_position(index)
+        lineNumber, column = position
+        line = self._document.get_line(lineNumber)
+        isValid = self._validator.is_split_valid(
+            lineNumber,
+            line[:column],
+            line[column:],
+        )
+        if isValid is None:
+            # A full parse is required.
+            for chunk in (
+                self._document.get_text(last=position),
+                self._document.get_text(first=position),
+            ):
+                if XmlValidator.get_parse_error([chunk]) is not None:
+                    return False
+
+            return True
+
+        return isValid
 
     def check_validity(self):
-        text = strip_illegal_characters(self.get("1.0", "end"))
-        xmlText = f'<a>{text}</a>'
-        try:
-            ET.fromstring(xmlText)
-        except Exception as ex:
-            issue, location = str(ex).split(':')
-            lineStr = re.search(r'line ([0-9]+)', location).group(1)
-            columnStr = re.search(r'column ([0-9]+)', location).group(1)
-            column = int(columnStr) - 3
-            self.mark_set('insert', f'{lineStr}.{column}')
-            raise ValueError(f'{issue}: line {lineStr} column {column}')
+        """Raise ValueError if the text is not well-formed XML.
+        
+        Only if the line by line check is not sufficient, 
+        parse the whole text in order to locate the error.
+        """
+        if self._validator.is_well_formed():
+            return True
+
+        error = XmlValidator.get_parse_error(
+            self._document.iter_chunks(self._PARSE_CHUNK_LINES)
+        )
+        if error is None:
+            return True
+
+        issue, lineNumber, column = error
+        self.mark_set('insert', f'{self._show_line(lineNumber)}.{column}')
+        raise ValueError(f'{issue}: line {lineNumber} column {column}')
+
+    def clear_search(self):
+        """Stop searching and remove the search hit highlighting."""
+        self._matchIndex.clear()
+        self.tag_remove(self.SEARCH_TAG, '1.0', 'end')
+
+    def find_next(self, backwards=False):
+        """Select the search hit next to the cursor position.
+        
+        Optional arguments:
+            backwards: bool -- If True, select the previous search hit.
+        
+        Return True if a search hit is selected.
+        """
+        lineStr, columnStr = self.index('insert').split('.')
+        match = self._matchIndex.find(
+            int(lineStr) + self._windowOffset,
+            int(columnStr),
+            backwards=backwards,
+        )
+        if match is None:
             return False
 
+        lineNumber, start, end = match
+        lineNumber = self._show_line(lineNumber)
+        self.tag_remove('sel', '1.0', 'end')
+        self.tag_add('sel', f'{lineNumber}.{start}', f'{lineNumber}.{end}')
+        if backwards:
+            self.mark_set('insert', f'{lineNumber}.{start}')
+        else:
+            self.mark_set('insert', f'{lineNumber}.{end}')
+        self.see('insert')
         return True
 
+    def get_match_count(self):
+        """Return the number of search hits."""
+        return self._matchIndex.get_count()
+
+    def replace_all(self, replacement):
+        """Replace all search hits as one single undo step.
+        
+        Positional arguments:
+            replacement: str -- The replacement text.
+                                Backslash escapes are processed
+                                as with re.sub().
+        
+        Return the number of replacements.
+        """
+        if self._matchIndex.regex is None:
+            return 0
+
+        replacements = 0
+        with self.undo_block():
+            for lineNumber in reversed(self._matchIndex.get_line_numbers()):
+                line = self._document.get_line(lineNumber)
+                parts = []
+                start = 0
+                for match in self._matchIndex.iter_matches(line):
+                    parts.append(line[start:match.start()])
+                    parts.append(match.expand(replacement))
+                    start = match.end()
+                    replacements += 1
+                parts.append(line[start:])
+                widgetLine = lineNumber - self._windowOffset
+                if 0 < widgetLine <= self._lineCount:
+                    self.replace(
+                        f'{widgetLine}.0',
+                        f'{widgetLine}.0 lineend',
+                        ''.join(parts),
+                    )
+                else:
+                    self._set_stored_line(lineNumber, ''.join(parts))
+        return replacements
+
+    def replace_match(self, replacement):
+        """Replace the selected search hit and select the next one.
+        
+        Positional arguments:
+            replacement: str -- The replacement text.
+                                Backslash escapes are processed
+                                as with re.sub().
+        
+        If the selection is no search hit, just select the next one.
+        Return True if a replacement was made.
+        """
+        isReplaced = False
+        if self._matchIndex.regex is not None and self.tag_ranges('sel'):
+            lineNumber = int(self.index('sel.first').split('.')[0])
+            line = self.get(f'{lineNumber}.0', f'{lineNumber}.0 lineend')
+            selection = (self.index('sel.first'), self.index('sel.last'))
+            for match in self._matchIndex.iter_matches(line):
+                if selection == (
+                    f'{lineNumber}.{match.start()}',
+                    f'{lineNumber}.{match.end()}',
+                ):
+                    newText = match.expand(replacement)
+                    with self.undo_block():
+                        self.replace(*selection, newText)
+                    self.mark_set(
+                        'insert',
+                        f'{lineNumber}.{match.start()} +{len(newText)}c',
+                    )
+                    isReplaced = True
+                    break
+
+        self.find_next()
+        return isReplaced
+
+    def set_search(self, pattern, flags=0):
+        """Index and highlight the search hits of a pattern.
+        
+        Positional arguments:
+            pattern: str or compiled regular expression.
+            
+        Optional arguments:
+            flags: int -- Regular expression flags for a string pattern.
+            
+        The search hits are kept up to date while the text is edited.
+        Matches within XML tags are skipped.
+        Return the number of search hits.
+        Raise re.error if the pattern is invalid.
+        """
+        regex = re.compile(pattern, flags)
+        self._matchIndex.set_pattern(regex, self._document.get_lines())
+        self.tag_remove(self.SEARCH_TAG, '1.0', 'end')
+        self._tag_search_hits(1, None)
+        return self._matchIndex.get_count()
+
+    def get_undo_usage(self):
+        """Return the number of undo steps and their text size in bytes."""
+        return len(self._undoSteps), self._undoBytes
+
+    def has_changed(self):
+        """Return True if the text was changed since the last reset."""
+        return self._revision != self._appliedRevision
+
+    def reset_changed(self):
+        """Consider the current text as unchanged."""
+        self._appliedRevision = self._revision
+
     def clear(self):
         self.delete('1.0', 'end')
 
+    def get_snapshot(self):
+        """Return a TextDocument copy of the text.
+        
+        The copy shares the unchanged lines with the editor,
+        and it can be read by a worker thread.
+        """
+        return self._document.snapshot()
+
     def get_text(self, start='1.0', end='end'):
-        """Return the whole text from the editor box."""
-        text = self.get(start, end)
-        text = text.strip(' \n')
-        text = text.replace('\n', '')
-        return strip_illegal_characters(text)
+        """Return the whole text from the editor box.
+        
+        Include the lines not loaded into the widget,
+        if start is at the beginning, or end is at the end.
+        """
+        return self.get_section_content(self._get_raw_text(start, end))
+
+    def find_ranges(self, pattern, flags=0):
+        """Return a list of (lineNumber, start, end) tuples of the matches.
+        
+        Positional arguments:
+            pattern: str or compiled regular expression.
+            
+        Optional arguments:
+            flags: int -- Regular expression flags for a string pattern.
+            
+        The line numbers refer to the whole text, including the lines
+        not loaded into the widget; start and end are columns.
+        Matches within XML tags, across tags, or across lines are skipped.
+        """
+        regex = re.compile(pattern, flags)
+        ranges = []
+        lines = self._document.get_lines()
+        for lineNumber, line in enumerate(lines, 1):
+            for start, end in get_text_spans(line):
+                for match in regex.finditer(line, start, end):
+                    if match.end() > match.start():
+                        ranges.append((lineNumber, match.start(), match.end()))
+        return ranges
 
     def colorize(self, event=None):
-        """Colorize the XML tags."""
-        self.tag_remove(self.XML_TAG, '1.0', 'end')
-        for i in range(int(self.index('end').split('.')[0])):
-            line = self.get(f'{i}.0', f'{i}.0 lineend')
-            for xmlTag in re.finditer('<.*?>', line):
-                self.tag_add(
-                    self.XML_TAG,
-                    f'{i}.{xmlTag.start()}',
-                    f'{i}.{xmlTag.end()}',
-                )
+        """Colorize the XML tags in the lines changed since the last pass.
+        
+        Cancel any scheduled highlighting, since it is done here.
+        """
+        self._cancel_highlighting()
+        dirtyRanges = self.tag_ranges(self._DIRTY_TAG)
+        for i in range(0, len(dirtyRanges), 2):
+            self._colorize_lines(
+                int(str(dirtyRanges[i]).split('.')[0]),
+                int(str(dirtyRanges[i + 1]).split('.')[0]),
+            )
+        self.tag_remove(self._DIRTY_TAG, '1.0', 'end')
+
+    def colorize_all(self):
+        """Colorize the XML tags of the whole text."""
+        self._cancel_highlighting()
+        self._colorize_lines(1, int(self.index('end').split('.')[0]))
+        self.tag_remove(self._DIRTY_TAG, '1.0', 'end')
+
+    def destroy(self):
+        """Restore the original widget command before destroying the widget.
+        
+        Extends the superclass method.
+        """
+        self._cancel_highlighting()
+        if self._windowJob is not None:
+            self.after_cancel(self._windowJob)
+        self.tk.deletecommand(self._w)
+        self.tk.call('rename', self._origCommand, self._w)
+        super().destroy()
 
-    def set_text(self, text):
-        """Put text into the editor box and clear the undo/redo stack."""
+    def set_style(self, font, boldFont, foreground, background,
+                  xmlTagColor):
+        """Apply fonts and colors shared with other editor boxes.
+        
+        Positional arguments:
+            font -- The text font.
+            boldFont -- The font of the XML tags.
+            foreground, background, xmlTagColor: str -- Tk colors.
+        """
+        self.configure(
+            font=font,
+            fg=foreground,
+            bg=background,
+            insertbackground=foreground,
+        )
+        self.tag_configure(
+            self.XML_TAG,
+            foreground=xmlTagColor,
+            font=boldFont,
+        )
+
+    def set_text(self, text, preparedText=None):
+        """Put text into the editor box and clear the undo/redo stack.
+        
+        Positional arguments:
+            text: str -- The section content.
+            
+        Optional arguments:
+            preparedText: tuple -- The result of prepare_text(text),
+                                   if already available.
+        """
         startIndex = len("<p>")
+        if preparedText is None:
+            preparedText = self.prepare_text(text, withTags=False)
+        displayText, tagIndices = preparedText
+        lines = displayText.split('\n')
+        if self.windowLines and len(lines) > self.windowLines:
+            # Load only the first lines into the widget.
+            displayText = '\n'.join(lines[:self.windowLines])
+            tagIndices = None
+        self._swap_lines('delete', '1.0', 'end')
+        self._swap_lines('insert', '1.0', displayText)
+        self._windowOffset = 0
+        self._lineCount = min(len(lines), self.windowLines or len(lines))
+        self._revision += 1
+        # Pass the whole text to the line listeners at once.
+        self._notify_line_listeners(
+            1,
+            self._document.get_line_count(),
+            lines,
+        )
+        self.edit_reset()
+        # this is to prevent the user from clearing the box with Ctrl-Z
+        self.reset_changed()
+        self.mark_set('insert', f'1.{startIndex}')
+        self.see('insert')
+        if tagIndices is not None:
+            # The text is already tokenized.
+            self._cancel_highlighting()
+            if tagIndices:
+                self.tag_add(self.XML_TAG, *tagIndices)
+        elif self.lazyHighlighting:
+            self._cancel_highlighting()
+            self.tag_add(self._DIRTY_TAG, '1.0', 'end')
+            self._highlight_chunk()
+        else:
+            self.colorize_all()
+        if self._matchIndex.regex is not None:
+            self._tag_search_hits(1, None)
+
+    def load_text(self, index, text, end=None):
+        """Insert text that is loaded, not edited, e.g. lazily.
+        
+        Positional arguments:
+            index: str -- The insertion position.
+            text: str -- The text prepared for display.
+        
+        Optional arguments:
+            end: str -- If given, replace the text from index to end.
+        
+        The text is not considered a change,
+        and it is not recorded for undo.
+        The line numbers of the undo/redo steps are adjusted.
+        If the text is loaded into lines changed by these steps,
+        the undo/redo stack is cleared.
+        """
+        isChanged = self.has_changed()
+        firstLine = self._get_line_number(index)
+        if end is None:
+            lastLine = firstLine
+        else:
+            lastLine = self._get_line_number(end)
+        lineCount = self._document.get_line_count()
+        self._isLoading = True
+        try:
+            if end is not None:
+                self.delete(index, end)
+            if text:
+                self.insert(index, text)
+        finally:
+            self._isLoading = False
+            self._undoAnchor = None
+        self._shift_undo_steps(
+            firstLine + self._windowOffset,
+            lastLine + self._windowOffset,
+            self._document.get_line_count() - lineCount,
+        )
+        if not isChanged:
+            self.reset_changed()
+
+    def is_recorded(self, index, end):
+        """Return True if undo or redo steps change the text from index to end.
+        
+        Loading text there would clear the undo/redo stack.
+        """
+        for change in self._get_later_changes(
+            self._get_line_number(index) + self._windowOffset,
+            self._get_line_number(end) + self._windowOffset,
+        ):
+            if change is None:
+                return True
+
+        return False
+
+    def split_off(self, index='insert'):
+        """Remove the text from index to the end.
+        
+        Return the section content of the removed text.
+        """
+        content = self.get_text(index, 'end')
+        firstLine = self._windowOffset + self._lineCount + 1
+        lastLine = self._document.get_line_count()
+        if lastLine >= firstLine:
+            self._notify_line_listeners(firstLine, lastLine, [])
+            self._revision += 1
+        self.delete(index, 'end')
+        return content
+
+    @classmethod
+    def prepare_text(cls, text, withTags=True):
+        """Return a (displayText, tagIndices) tuple for set_text().
+        
+        Positional arguments:
+            text: str -- The section content.
+            
+        Optional arguments:
+            withTags: bool -- If False, tagIndices is None.
+        
+        This does not access the widget,
+        so it can be done in advance.
+        """
         if not text:
             text = '<p></p>'
         for tag in ('p', 'h5', 'h6', 'h7', 'h8', 'h9'):
             text = text.replace(f'</{tag}>', f'</{tag}>\n')
-        self.insert('end', text)
-        self.edit_reset()
-        # this is to prevent the user from clearing the box with Ctrl-Z
-        self.mark_set('insert', f'1.{startIndex}')
-        self.colorize()
+        if len(text) > cls._MAX_LINE_LENGTH:
+            lines = text.split('\n')
+            if max(len(line) for line in lines) > cls._MAX_LINE_LENGTH:
+                text = '\n'.join(cls._break_line(line) for line in lines)
+        if withTags:
+            return text, get_tag_indices(text)
+
+        return text, None
+
+    @staticmethod
+    def get_section_content(text):
+        """Return the section content for a text taken from the editor box.
+        
+        This is the reverse of prepare_text().
+        It does not access the widget,
+        so it can be done in a worker thread.
+        """
+        text = text.strip(' \n')
+        text = text.replace('\n', '')
+        return strip_illegal_characters(text)
+
+    @contextmanager
+    def undo_block(self):
+        """Make all changes within the block one single undo step."""
+        if not self._undoBlockLevel:
+            self.edit_separator()
+        self._undoBlockLevel += 1
+        try:
+            yield
+        finally:
+            self._undoBlockLevel -= 1
+            if not self._undoBlockLevel:
+                self.edit_separator()
 
     def emphasis(self, event=None):
         """Make the selection emphasized.
@@ -133,14 +633,97 @@ class EditorBox(tk.Text):
         self._set_format()
         return 'break'
 
+    def format_matches(self, pattern, tag='', remove=False, flags=0):
+        """Format all matches of pattern as one single undo step.
+        
+        Positional arguments:
+            pattern: str or compiled regular expression.
+            
+        Optional arguments: see format_ranges().
+            flags: int -- Regular expression flags for a string pattern.
+        
+        Return the number of changed matches.
+        """
+        ranges = []
+        storedSpans = {}
+        # matches in lines not loaded into the widget, by line number
+        for lineNumber, start, end in self.find_ranges(pattern, flags):
+            widgetLine = lineNumber - self._windowOffset
+            if 0 < widgetLine <= self._lineCount:
+                ranges.append((f'{widgetLine}.{start}', f'{widgetLine}.{end}'))
+            else:
+                storedSpans.setdefault(lineNumber, []).append((start, end))
+        with self.undo_block():
+            changedRanges = self.format_ranges(ranges, tag=tag, remove=remove)
+            for lineNumber, spans in storedSpans.items():
+                line, changedSpans = self._format_line(
+                    self._document.get_line(lineNumber),
+                    spans,
+                    tag,
+                    remove or not tag,
+                )
+                if changedSpans:
+                    self._set_stored_line(lineNumber, line)
+                    changedRanges += changedSpans
+        return changedRanges
+
+    def format_ranges(self, ranges, tag='', remove=False):
+        """Format a list of text ranges as one single undo step.
+        
+        Positional arguments:
+            ranges: list of (first, last) Tk text index pairs.
+            
+        Optional arguments:
+            tag: str -- 'em' or 'strong'. If empty, all markup is removed.
+            remove: bool -- If True, remove the tag's markup
+                            instead of adding it.
+        
+        Markup enclosing a range is removed along with the markup inside.
+        Overlapping ranges are skipped.
+        Return the number of changed ranges.
+        """
+        positions = []
+        for first, last in ranges:
+            first = self.index(first)
+            last = self.index(last)
+            positions.append((
+                tuple(map(int, first.split('.'))),
+                tuple(map(int, last.split('.'))),
+                first,
+                last,
+            ))
+
+        # Process the ranges from last to first,
+        # so the indices of the pending ones remain valid.
+        positions.sort(reverse=True)
+        changedRanges = 0
+        previousStart = None
+        with self.undo_block():
+            for start, end, first, last in positions:
+                if previousStart is not None and end > previousStart:
+                    continue
+
+                previousStart = start
+                self.mark_set(self._RANGE_FIRST, first)
+                self.mark_set(self._RANGE_LAST, last)
+                if self._format_range(tag, remove or not tag):
+                    changedRanges += 1
+            self.mark_unset(self._RANGE_FIRST, self._RANGE_LAST)
+        return changedRanges
+
     def new_paragraph(self, event=None):
         """Insert an opening/closing pair of paragraph tags."""
-        self.insert('insert', '</p>\n<p>')
-        self.colorize()
+        with self.undo_block():
+            self.insert('insert', '</p>\n<p>')
         return 'break'
 
     def _set_format(self, event=None, tag=''):
         """Insert an opening/closing pair of novelibre markup tags."""
+        with self.undo_block():
+            self._toggle_format(tag)
+
+    def _toggle_format(self, tag):
+        # Toggle the markup of the selection or at the cursor position.
         if tag:
             # Toggle format as specified by tag.
             if self.tag_ranges('sel'):
@@ -165,10 +748,7 @@ class EditorBox(tk.Text):
         elif self.tag_ranges('sel'):
             # Remove all markup from the selection.
             text = self.get('sel.first', 'sel.last')
-            for tag in self._TAGS:
-                text = self._remove_format(text, tag)
-            self._replace_selected(text)
-        self.colorize()
+            self._replace_selected(self._remove_format(text, *self._TAGS))
 
     def _replace_selected(self, text):
         """Replace the selected passage with text; keep the selection."""
@@ -179,22 +759,804 @@ class EditorBox(tk.Text):
         selLast = self.index('insert')
         self.tag_add('sel', selFirst, selLast)
 
-    def _remove_format(self, text, tag):
-        """Return text without opening/closing markup, if any."""
-        if tag in self._TAGS:
-            finished = False
-            while not finished:
-                start = text.find(f'<{tag}>')
-                if start >= 0:
-                    end = text.find(f'</{tag}>')
-                    if  start < end:
-                        text = (
-                            f'{text[:start]}{text[start + len(tag) +2:end]}'
-                            f'{text[end + len(tag) + 3:]}'
-                        )
-                    else:
-                        finished = True
-                else:
-                    finished = True
+    def _format_range(self, tag, remove):
+        # Add or remove markup between the range marks.
+        # Return True if the text was changed.
+        self.mark_gravity(self._RANGE_FIRST, 'left')
+        self.mark_gravity(self._RANGE_LAST, 'right')
+        # Text inserted at the range boundaries is thus inside the range.
+        if tag:
+            tags = (tag,)
+        else:
+            tags = self._TAGS
+        text = self.get(self._RANGE_FIRST, self._RANGE_LAST)
+        newText = self._remove_format(text, *tags)
+        isChanged = newText != text
+        if isChanged:
+            self.replace(self._RANGE_FIRST, self._RANGE_LAST, newText)
+        for tagName in tags:
+            startTag = f'<{tagName}>'
+            endTag = f'</{tagName}>'
+            startTagFirst = f'{self._RANGE_FIRST}-{len(startTag)}c'
+            endTagLast = f'{self._RANGE_LAST}+{len(endTag)}c'
+            if (
+                self.get(startTagFirst, self._RANGE_FIRST) != startTag
+                or self.get(self._RANGE_LAST, endTagLast) != endTag
+            ):
+                continue
+
+            if not remove:
+                # The range is already formatted.
+                return isChanged
+
+            self.delete(self._RANGE_LAST, endTagLast)
+            self.delete(startTagFirst, self._RANGE_FIRST)
+            isChanged = True
+        if not remove:
+            self.insert(self._RANGE_LAST, endTag)
+            self.insert(self._RANGE_FIRST, startTag)
+            isChanged = True
+        return isChanged
+
+    def _format_line(self, line, spans, tag, remove):
+        # Add or remove markup of the (start, end) column spans of a line
+        # not loaded into the widget, as _format_range() does in the widget.
+        # Return the new line and the number of changed spans.
+        if tag:
+            tags = (tag,)
+        else:
+            tags = self._TAGS
+        changedSpans = 0
+        previousStart = None
+        for start, end in sorted(spans, reverse=True):
+            if previousStart is not None and end > previousStart:
+                continue
+
+            previousStart = start
+            text = line[start:end]
+            newText = self._remove_format(text, *tags)
+            isChanged = newText != text
+            line = f'{line[:start]}{newText}{line[end:]}'
+            end = start + len(newText)
+            isFormatted = False
+            for tagName in tags:
+                startTag = f'<{tagName}>'
+                endTag = f'</{tagName}>'
+                if (
+                    start < len(startTag)
+                    or line[start - len(startTag):start] != startTag
+                    or line[end:end + len(endTag)] != endTag
+                ):
+                    continue
+
+                if not remove:
+                    # The span is already formatted.
+                    isFormatted = True
+                    break
+
+                line = (
+                    f'{line[:start - len(startTag)]}{line[start:end]}'
+                    f'{line[end + len(endTag):]}'
+                )
+                start -= len(startTag)
+                end -= len(startTag)
+                isChanged = True
+            if not (remove or isFormatted):
+                line = (
+                    f'{line[:start]}<{tag}>{line[start:end]}'
+                    f'</{tag}>{line[end:]}'
+                )
+                isChanged = True
+            if isChanged:
+                changedSpans += 1
+        return line, changedSpans
+
+    def _remove_format(self, text, *tags):
+        """Return text without opening/closing markup of the given tags.
+        
+        The text is scanned once for all tags.
+        Only matching pairs are removed, so unpaired tags are kept.
+        """
+        openTags = {tag: [] for tag in tags if tag in self._TAGS}
+        removals = []
+        for match in self._FORMAT_TAG.finditer(text):
+            tag = match.group(2)
+            if not tag in openTags:
+                continue
+
+            if not match.group(1):
+                openTags[tag].append(match.span())
+            elif openTags[tag]:
+                removals.append(openTags[tag].pop())
+                removals.append(match.span())
+        if not removals:
             return text
 
+        removals.sort()
+        parts = []
+        start = 0
+        for end, nextStart in removals:
+            parts.append(text[start:end])
+            start = nextStart
+        parts.append(text[start:])
+        return ''.join(parts)
+
+    def _apply_changes(self, changes):
+        # Apply the changes of an undo or redo step,
+        # and show the position of the last change.
+        if not changes:
+            return
+
+        self._isUndoing = True
+        try:
+            for firstLine, currentLines, targetLines in changes:
+                lineNumber, column = self._restore_lines(
+                    firstLine,
+                    currentLines,
+                    targetLines,
+                )
+        finally:
+            self._isUndoing = False
+        self._undoAnchor = None
+        self.mark_set('insert', f'{self._show_line(lineNumber)}.{column}')
+        self.see('insert')
+
+    @classmethod
+    def _break_line(cls, line):
+        # Break a long line for display after spaces outside the XML tags.
+        # Since the line breaks are removed when getting the text,
+        # this does not change the section content.
+        if len(line) <= cls._MAX_LINE_LENGTH:
+            return line
+
+        parts = []
+        start = 0
+        for spanStart, spanEnd in get_text_spans(line):
+            while spanEnd - start > cls._MAX_LINE_LENGTH:
+                searchStart = max(start, spanStart)
+                breakPos = line.rfind(
+                    ' ',
+                    searchStart,
+                    start + cls._MAX_LINE_LENGTH,
+                )
+                if breakPos < 0:
+                    breakPos = line.find(' ', searchStart, spanEnd)
+                if breakPos < 0:
+                    break
+
+                parts.append(line[start:breakPos + 1])
+                start = breakPos + 1
+        parts.append(line[start:])
+        return '\n'.join(parts)
+
+    def _cancel_highlighting(self):
+        # Cancel the scheduled highlighting, if any.
+        if self._highlightJob is not None:
+            self.after_cancel(self._highlightJob)
+            self._highlightJob = None
+
+    def _colorize_dirty(self, firstLine, lastLine):
+        # Colorize the dirty lines between firstLine and lastLine.
+        startIndex = f'{firstLine}.0'
+        endIndex = f'{lastLine}.0 lineend +1c'
+        dirtyRange = self.tag_prevrange(self._DIRTY_TAG, f'{startIndex} +1c')
+        if not dirtyRange or self.compare(dirtyRange[1], '<=', startIndex):
+            dirtyRange = self.tag_nextrange(
+                self._DIRTY_TAG,
+                startIndex,
+                endIndex,
+            )
+        if not dirtyRange:
+            return
+
+        while dirtyRange:
+            self._colorize_lines(
+                max(firstLine, int(str(dirtyRange[0]).split('.')[0])),
+                min(lastLine, int(str(dirtyRange[1]).split('.')[0])),
+            )
+            dirtyRange = self.tag_nextrange(
+                self._DIRTY_TAG,
+                dirtyRange[1],
+                endIndex,
+            )
+        self.tag_remove(self._DIRTY_TAG, startIndex, endIndex)
+
+    def _colorize_lines(self, firstLine, lastLine):
+        # Colorize the XML tags from firstLine to lastLine.
+        # Fetch the text once and apply all tag ranges in one call.
+        startIndex = f'{firstLine}.0'
+        endIndex = f'{lastLine}.0 lineend'
+        self.tag_remove(self.XML_TAG, startIndex, endIndex)
+        tagIndices = get_tag_indices(
+            self.get(startIndex, endIndex),
+            firstLine,
+        )
+        if tagIndices:
+            self.tag_add(self.XML_TAG, *tagIndices)
+
+    def _delete_chars(self, *args):
+        # Delete characters and update the line states.
+        if len(args) > 2:
+            # Multiple ranges: all following lines are affected.
+            firstLine = min(self._get_line_number(index) for index in args)
+            lastLine = self._get_line_number('end')
+            self._prepare_undo('delete', None, None)
+            result = self.tk.call((self._origCommand, 'delete') + args)
+            self._undoAnchor = None
+            self._on_text_change(
+                firstLine,
+                lastLine,
+                self._get_line_number('end'),
+            )
+            return result
+
+        firstIndex = self._get_index(args[0])
+        if len(args) == 2:
+            lastIndex = self._get_index(args[1])
+        else:
+            lastIndex = self._get_index(f'{args[0]} +1c')
+        if not self.tk.getboolean(self.tk.call(
+            self._origCommand,
+            'compare',
+            firstIndex,
+            '<',
+            lastIndex,
+        )):
+            # Nothing to delete.
+            return ''
+
+        self._prepare_undo('delete', firstIndex, lastIndex)
+        result = self.tk.call((self._origCommand, 'delete') + args)
+        self._undoAnchor = ('delete', firstIndex)
+        firstLine = int(firstIndex.split('.')[0])
+        self._on_text_change(
+            firstLine,
+            int(lastIndex.split('.')[0]),
+            firstLine,
+        )
+        return result
+
+    def _dispatch(self, operation, *args):
+        # Pass a widget command to the original Tk text widget.
+        # Keep track of the lines affected by insertions and deletions.
+        try:
+            if operation == 'insert':
+                return self._insert_chars(*args)
+
+            if operation == 'delete':
+                return self._delete_chars(*args)
+
+            if operation == 'replace':
+                # Resolve the start index before deleting, since
+                # a tag or mark based index may not survive deletion.
+                firstIndex = self._get_index(args[0])
+                with self.undo_block():
+                    result = self._delete_chars(firstIndex, args[1])
+                    self._insert_chars(firstIndex, *args[2:])
+                return result
+
+            if operation == 'edit':
+                return self._edit(*args)
+
+            return self.tk.call((self._origCommand, operation) + args)
+
+        except tk.TclError:
+            # Errors must not propagate into the Tcl command;
+            # Tk's own bindings rely on failing commands being ignored.
+            return ''
+
+    def _edit(self, *args):
+        # Undo and redo the changes recorded by _record_change(),
+        # instead of using Tk's undo stack.
+        if args[0] == 'undo':
+            if self._undoSteps:
+                step = self._undoSteps.pop()
+                self._undoBytes -= step[0]
+                self._redoSteps.append(step)
+                self._apply_changes([
+                    (firstLine, newLines, oldLines)
+                    for firstLine, oldLines, newLines in reversed(step[1])
+                ])
+            return ''
+
+        if args[0] == 'redo':
+            if self._redoSteps:
+                step = self._redoSteps.pop()
+                self._undoSteps.append(step)
+                self._undoBytes += step[0]
+                self._apply_changes(step[1])
+            return ''
+
+        if args[0] == 'canundo':
+            return int(bool(self._undoSteps))
+
+        if args[0] == 'canredo':
+            return int(bool(self._redoSteps))
+
+        if args[0] == 'reset':
+            self._undoSteps.clear()
+            self._redoSteps.clear()
+            self._undoBytes = 0
+            self._undoAnchor = None
+        elif args[0] == 'separator':
+            self._undoAnchor = None
+        return self.tk.call((self._origCommand, 'edit') + args)
+
+    @staticmethod
+    def _get_difference(oldText, newText):
+        # Return a (start, oldEnd, newEnd) tuple delimiting the parts
+        # where oldText and newText differ.
+        # The common beginning and end are found by bisection.
+        low = 0
+        high = min(len(oldText), len(newText))
+        while low < high:
+            middle = (low + high + 1) // 2
+            if oldText[:middle] == newText[:middle]:
+                low = middle
+            else:
+                high = middle - 1
+        start = low
+        low = 0
+        high = min(len(oldText), len(newText)) - start
+        while low < high:
+            middle = (low + high + 1) // 2
+            if (oldText[len(oldText) - middle:]
+                == newText[len(newText) - middle:]
+            ):
+                low = middle
+            else:
+                high = middle - 1
+        return start, len(oldText) - low, len(newText) - low
+
+    def _get_index(self, index):
+        # Return the "line.column" index, limited to the last text line.
+        index = str(self.tk.call(self._origCommand, 'index', index))
+        if self.tk.getboolean(
+            self.tk.call(self._origCommand, 'compare', index, '==', 'end')
+        ):
+            index = str(self.tk.call(self._origCommand, 'index', 'end-1c'))
+        return index
+
+    def _get_later_changes(self, firstLine, lastLine):
+        # Yield a (changes, i) tuple for each undo/redo change
+        # below the lines from firstLine to lastLine.
+        # Yield None and stop, if the lines overlap with a change.
+        for steps, isUndo in (
+            (reversed(self._undoSteps), True),
+            (reversed(self._redoSteps), False),
+        ):
+            # Go back through the undo steps, then forward
+            # through the redo steps, keeping track of the position
+            # of the lines at the time of each change.
+            low, high = firstLine, lastLine
+            for step in steps:
+                changes = step[1]
+                if isUndo:
+                    indices = reversed(range(len(changes)))
+                else:
+                    indices = range(len(changes))
+                for i in indices:
+                    changeFirst, oldLines, newLines = changes[i]
+                    if isUndo:
+                        lineCount = len(newLines)
+                        shift = len(oldLines) - len(newLines)
+                    else:
+                        lineCount = len(oldLines)
+                        shift = len(newLines) - len(oldLines)
+                    if changeFirst + lineCount - 1 < low:
+                        low += shift
+                        high += shift
+                    elif changeFirst > high:
+                        yield changes, i
+                    else:
+                        yield None
+                        return
+
+    def _get_line_number(self, index):
+        # Return the line number of index, limited to the last text line.
+        return int(self._get_index(index).split('.')[0])
+
+    def _get_position(self, index):
+        # Return the (line, column) position of index in the document.
+        lineStr, columnStr = self._get_index(index).split('.')
+        return int(lineStr) + self._windowOffset, int(columnStr)
+
+    def _get_raw_text(self, start, end):
+        # Return the text between start and end,
+        # including the lines not loaded at the beginning or the end.
+        if self.compare(start, '<=', '1.0'):
+            first = None
+        else:
+            first = self._get_position(start)
+        if self.compare(end, '>=', 'end-1c'):
+            last = None
+        else:
+            last = self._get_position(end)
+        return self._document.get_text(first, last)
+
+    @staticmethod
+    def _get_size(lines):
+        # Return the text size of a list of lines in bytes.
+        return sum(len(line.encode('utf-8')) for line in lines)
+
+    @staticmethod
+    def _get_text_index(firstLine, text, offset):
+        # Return the "line.column" index of a character offset in text,
+        # which begins at the line with the number firstLine.
+        lineNumber = firstLine + text.count('\n', 0, offset)
+        column = offset - text.rfind('\n', 0, offset) - 1
+        return f'{lineNumber}.{column}'
+
+    def _get_visible_lines(self):
+        # Return the numbers of the first and the last visible line.
+        firstIndex = self.index('@0,0')
+        lastIndex = self.index(f'@0,{self.winfo_height()}')
+        return int(firstIndex.split('.')[0]), int(lastIndex.split('.')[0])
+
+    def _highlight_chunk(self, viewportFirst=False):
+        # Colorize a limited number of dirty lines.
+        # Reschedule, if there are dirty lines left,
+        # yielding to the event loop in the meantime.
+        # In lazy mode, colorize only the viewport and its margins.
+        self._highlightJob = None
+        if viewportFirst or self.lazyHighlighting:
+            firstLine, lastLine = self._get_visible_lines()
+            if self.lazyHighlighting:
+                firstLine = max(1, firstLine - self._MARGIN_LINES)
+                lastLine += self._MARGIN_LINES
+            self._colorize_dirty(firstLine, lastLine)
+            if self.lazyHighlighting:
+                # The other lines are colorized when scrolled into view.
+                return
+
+        dirtyRange = self.tag_nextrange(self._DIRTY_TAG, '1.0')
+        if not dirtyRange:
+            return
+
+        firstLine = int(str(dirtyRange[0]).split('.')[0])
+        self._colorize_dirty(firstLine, firstLine + self._CHUNK_LINES - 1)
+        if self.tag_nextrange(self._DIRTY_TAG, '1.0'):
+            self._highlightJob = self.after_idle(self._highlight_chunk)
+
+    def _insert_chars(self, index, *args):
+        # Insert characters and update the line states.
+        firstIndex = self._get_index(index)
+        chars = ''.join(args[::2])
+        self._prepare_undo('insert', firstIndex, firstIndex)
+        result = self.tk.call((self._origCommand, 'insert', index) + args)
+        self._undoAnchor = (
+            'insert',
+            str(self.tk.call(
+                self._origCommand,
+                'index',
+                f'{firstIndex} +{len(chars)}c',
+            )),
+        )
+        firstLine = int(firstIndex.split('.')[0])
+        self._on_text_change(
+            firstLine,
+            firstLine,
+            firstLine + chars.count('\n'),
+        )
+        return result
+
+    def _is_recording(self):
+        # Return True if changes are to be recorded for undo.
+        return bool(
+            self._isUndoEnabled
+            and not (self._isUndoing or self._isLoading)
+            and self._undoSteps
+        )
+
+    def _is_windowed(self):
+        # Return True if not all lines are loaded into the widget.
+        return bool(
+            self._windowOffset
+            or self._document.get_line_count() > self._lineCount
+        )
+
+    def _limit_undo_memory(self):
+        # Drop the oldest undo steps exceeding the memory budget,
+        # keeping at least the current step.
+        if not self.maxUndoBytes:
+            return
+
+        while self._undoBytes > self.maxUndoBytes and len(self._undoSteps) > 1:
+            self._undoBytes -= self._undoSteps.popleft()[0]
+
+    def _move_window(self, lineNumber):
+        # Load the lines around line lineNumber of the text into the widget.
+        lineCount = self._document.get_line_count()
+        firstLine = lineNumber - self.windowLines // 2
+        firstLine = max(1, min(firstLine, lineCount - self.windowLines + 1))
+        lastLine = min(firstLine + self.windowLines - 1, lineCount)
+        self._windowOffset = firstLine - 1
+        self._swap_lines('delete', '1.0', 'end')
+        self._swap_lines(
+            'insert',
+            '1.0',
+            '\n'.join(self._document.get_lines(firstLine, lastLine)),
+        )
+        self._lineCount = lastLine - firstLine + 1
+        self._on_window_change(1, self._lineCount)
+
+    def _notify_line_listeners(self, firstLine, oldLastLine, newLines):
+        # Pass changed lines to the line listeners.
+        # The line numbers refer to the whole text, including the lines
+        # not loaded into the widget.
+        for listener in self._lineListeners:
+            listener.replace_lines(firstLine, oldLastLine, newLines)
+        for listener in self._changeListeners:
+            listener()
+
+    def _on_text_change(self, firstLine, oldLastLine, newLastLine):
+        # Tag the changed lines for colorizing.
+        # Pass the new text of the changed lines to the line listeners.
+        # Record the change for undo.
+        self._revision += 1
+        self._lineCount += newLastLine - oldLastLine
+        self.tk.call(
+            self._origCommand,
+            'tag',
+            'add',
+            self._DIRTY_TAG,
+            f'{firstLine}.0',
+            f'{newLastLine}.0 lineend +1c',
+        )
+        self._schedule_highlighting()
+        if self._lineListeners:
+            newLines = str(self.tk.call(
+                self._origCommand,
+                'get',
+                f'{firstLine}.0',
+                f'{newLastLine}.0 lineend',
+            )).split('\n')
+            if self._is_recording():
+                self._record_change(
+                    firstLine + self._windowOffset,
+                    self._document.get_lines(
+                        firstLine + self._windowOffset,
+                        oldLastLine + self._windowOffset,
+                    ),
+                    newLines,
+                )
+            self._notify_line_listeners(
+                firstLine + self._windowOffset,
+                oldLastLine + self._windowOffset,
+                newLines,
+            )
+        if self._matchIndex.regex is not None:
+            self.tk.call(
+                self._origCommand,
+                'tag',
+                'remove',
+                self.SEARCH_TAG,
+                f'{firstLine}.0',
+                f'{newLastLine}.0 lineend',
+            )
+            self._tag_search_hits(firstLine, newLastLine)
+
+    def _on_window_change(self, firstLine, lastLine):
+        # Highlight the lines moved into the widget.
+        # Start a new undo step with the next change,
+        # since the widget positions may have changed.
+        self._undoAnchor = None
+        self.tk.call(
+            self._origCommand,
+            'tag',
+            'add',
+            self._DIRTY_TAG,
+            f'{firstLine}.0',
+            f'{lastLine}.0 lineend +1c',
+        )
+        self._schedule_highlighting()
+        if self._matchIndex.regex is not None:
+            self._tag_search_hits(firstLine, lastLine)
+
+    def _on_yscroll(self, first, last):
+        # Update the scrollbar.
+        # In lazy mode, colorize the lines scrolled into view.
+        # Move lines in and out of the widget, if the text is large.
+        # Notify the scroll listeners.
+        self.vbar.set(first, last)
+        if self.lazyHighlighting and self._highlightJob is None:
+            self._highlightJob = self.after_idle(self._highlight_chunk)
+        if self._is_windowed() and self._windowJob is None:
+            self._windowJob = self.after_idle(self._shift_window)
+        for listener in self._scrollListeners:
+            listener()
+
+    def _prepare_undo(self, kind, firstIndex, lastIndex):
+        # Start a new undo step before a change is made, unless the
+        # change continues the current one at the position where
+        # the last change left off, e.g. when typing,
+        # or is part of an undo block.
+        if not self._isUndoEnabled or self._isUndoing or self._isLoading:
+            return
+
+        if self._undoBlockLevel:
+            continuesStep = self._undoAnchor is not None
+        else:
+            continuesStep = self._undoAnchor in (
+                (kind, firstIndex),
+                (kind, lastIndex),
+            )
+        if not continuesStep or not self._undoSteps:
+            self._undoSteps.append([0, []])
+            if self.maxUndoSteps > 0:
+                while len(self._undoSteps) > self.maxUndoSteps:
+                    self._undoBytes -= self._undoSteps.popleft()[0]
+        self._redoSteps.clear()
+
+    def _record_change(self, firstLine, oldLines, newLines):
+        # Add a change to the current undo step.
+        # A change of the lines just changed is merged
+        # with the previous change, e.g. when typing.
+        step = self._undoSteps[-1]
+        changes = step[1]
+        size = 0
+        if changes:
+            lastFirst, lastOld, lastNew = changes[-1]
+            if lastFirst == firstLine and len(lastNew) == len(oldLines):
+                changes.pop()
+                size -= self._get_size(lastOld) + self._get_size(lastNew)
+                oldLines = lastOld
+        changes.append((firstLine, oldLines, newLines))
+        size += self._get_size(oldLines) + self._get_size(newLines)
+        step[0] += size
+        self._undoBytes += size
+        self._limit_undo_memory()
+
+    def _restore_lines(self, firstLine, currentLines, targetLines):
+        # Replace the lines from firstLine on with targetLines.
+        # Change only the part of the text that differs.
+        # Return the document position after the changed text.
+        currentText = '\n'.join(currentLines)
+        targetText = '\n'.join(targetLines)
+        start, currentEnd, targetEnd = self._get_difference(
+            currentText,
+            targetText,
+        )
+        lastLine = firstLine + len(currentLines) - 1
+        widgetFirst = firstLine - self._windowOffset
+        widgetLast = lastLine - self._windowOffset
+        if widgetFirst > 0 and widgetLast <= self._lineCount:
+            startIndex = self._get_text_index(widgetFirst, currentText, start)
+            self.delete(
+                startIndex,
+                self._get_text_index(widgetFirst, currentText, currentEnd),
+            )
+            if targetEnd > start:
+                self.insert(startIndex, targetText[start:targetEnd])
+        else:
+            # The lines are not or not completely loaded into the widget.
+            self._revision += 1
+            self._notify_line_listeners(firstLine, lastLine, targetLines)
+            if widgetLast < 1:
+                self._windowOffset += len(targetLines) - len(currentLines)
+            elif widgetFirst <= self._lineCount:
+                self._move_window(firstLine)
+        lineStr, columnStr = self._get_text_index(
+            firstLine,
+            targetText,
+            targetEnd,
+        ).split('.')
+        return int(lineStr), int(columnStr)
+
+    def _schedule_highlighting(self):
+        # Restart the debounce timer, so consecutive changes
+        # are highlighted together once typing pauses.
+        self._cancel_highlighting()
+        self._highlightJob = self.after(
+            self.highlightDelay,
+            self._highlight_chunk,
+            True,
+        )
+
+    def _set_stored_line(self, lineNumber, line):
+        # Replace a line not loaded into the widget.
+        # Record the change for undo.
+        self._prepare_undo('replace', None, None)
+        if self._is_recording():
+            self._record_change(
+                lineNumber,
+                [self._document.get_line(lineNumber)],
+                [line],
+            )
+            self._undoAnchor = ('replace', None)
+        self._revision += 1
+        self._notify_line_listeners(lineNumber, lineNumber, [line])
+
+    def _shift_undo_steps(self, firstLine, lastLine, delta):
+        # Adjust the undo and redo steps to the lines from firstLine
+        # to lastLine having been replaced without recording,
+        # with delta lines added.
+        # Clear the undo/redo stack, if the lines overlap with changes.
+        for change in self._get_later_changes(firstLine, lastLine):
+            if change is None:
+                self.edit_reset()
+                return
+
+            changes, i = change
+            changeFirst, oldLines, newLines = changes[i]
+            changes[i] = (changeFirst + delta, oldLines, newLines)
+
+    def _shift_window(self):
+        # Move lines into the widget when the view approaches its edges.
+        # Move lines out at the opposite edge, keeping the view in place.
+        self._windowJob = None
+        firstVisible, lastVisible = self._get_visible_lines()
+        self.mark_set(self._VIEW_TOP, '@0,0')
+        lastLoaded = self._windowOffset + self._lineCount
+        linesBelow = self._document.get_line_count() - lastLoaded
+        if (linesBelow > 0
+            and lastVisible > self._lineCount - self._SWAP_LINES // 2
+        ):
+            count = min(self._SWAP_LINES, linesBelow)
+            newLines = self._document.get_lines(
+                lastLoaded + 1,
+                lastLoaded + count,
+            )
+            self._swap_lines('insert', 'end-1c', '\n' + '\n'.join(newLines))
+            self._lineCount += count
+            removed = min(
+                count,
+                self._lineCount - self.windowLines,
+                firstVisible - 1,
+            )
+            if removed > 0:
+                self._swap_lines('delete', '1.0', f'{removed + 1}.0')
+                self._lineCount -= removed
+                self._windowOffset += removed
+            self._on_window_change(
+                self._lineCount - count + 1,
+                self._lineCount,
+            )
+        elif self._windowOffset and firstVisible <= self._SWAP_LINES // 2:
+            count = min(self._SWAP_LINES, self._windowOffset)
+            newLines = self._document.get_lines(
+                self._windowOffset - count + 1,
+                self._windowOffset,
+            )
+            self._windowOffset -= count
+            removed = min(
+                count,
+                self._lineCount + count - self.windowLines,
+                self._lineCount - lastVisible,
+            )
+            if removed > 0:
+                lastKept = self._lineCount - removed
+                self._swap_lines('delete', f'{lastKept}.0 lineend', 'end-1c')
+                self._lineCount -= removed
+            self._swap_lines('insert', '1.0', '\n'.join(newLines) + '\n')
+            self._lineCount += count
+            self._on_window_change(1, count)
+        else:
+            return
+
+        self.yview(self._VIEW_TOP)
+
+    def _show_line(self, lineNumber):
+        # Make sure that line lineNumber of the text is loaded
+        # into the widget. Return its line number in the widget.
+        if not 0 < lineNumber - self._windowOffset <= self._lineCount:
+            self._move_window(lineNumber)
+        return lineNumber - self._windowOffset
+
+    def _swap_lines(self, *args):
+        # Call the original widget command for moving lines
+        # in or out of the widget, bypassing the change tracking.
+        self.tk.call((self._origCommand,) + args)
+
+    def _tag_search_hits(self, firstLine, lastLine):
+        # Highlight the indexed search hits of the given widget lines.
+        offset = self._windowOffset
+        if lastLine is None:
+            lastLine = self._lineCount
+        indices = self._matchIndex.get_tag_indices(
+            firstLine + offset,
+            lastLine + offset,
+            lineOffset=offset,
+        )
+        if indices:
+            self.tag_add(self.SEARCH_TAG, *indices)
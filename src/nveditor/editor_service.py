@@ -4,19 +4,27 @@ Copyright (c) Peter Triesberger
 For further information see https://github.com/peter88213/nv_editor
 License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
 """
+import hashlib
 import os
 from pathlib import Path
-import sys
+import re
+from tkinter import simpledialog
 
+from nveditor.chapter_view import ChapterView
+from nveditor.edit_journal import EditJournal
 from nveditor.editor_box import EditorBox
 from nveditor.editor_view import EditorView
 from nveditor.nveditor_globals import DEFAULT_FONT
 from nveditor.nveditor_globals import FEATURE
-from nveditor.nveditor_globals import ICON
 from nveditor.nveditor_globals import prefs
 from nveditor.nveditor_locale import _
+from nveditor.resource_cache import ResourceCache
+from nveditor.section_replacer import SectionReplacer
+from nveditor.text_cache import TextCache
+from nveditor.xml_validator import XmlValidator
 from nvlib.controller.sub_controller import SubController
 from nvlib.gui.observer import Observer
+from nvlib.novx_globals import CHAPTER_PREFIX
 from nvlib.novx_globals import SECTION_PREFIX
 import tkinter as tk
 
@@ -36,8 +44,26 @@ class EditorService(SubController, Observer):
         paragraph_spacing=4,
         margin_x=40,
         margin_y=20,
+        highlight_delay=200,
+        pool_size=1,
+        max_undo_steps=1000,
+        max_undo_bytes=8000000,
+        window_lines=2000,
     )
-    OPTIONS = {}
+    OPTIONS = dict(
+        lazy_highlighting=True,
+        live_wordcount=True,
+    )
+    _POLL_INTERVAL = 100
+    # Milliseconds between checks whether a background task is done.
+    _MIN_FONT_SIZE = 6
+    # Smallest font size selectable in the View menu.
+    _SAVE_DELAY = 1000
+    # Milliseconds to wait for further changes before saving the preferences.
+    _JOURNAL_INTERVAL = 3000
+    # Milliseconds between passing the editor changes to the journal.
+    JOURNAL_DIR = 'journal'
+    # Subdirectory of the configuration directory.
 
     def __init__(self, model, view, controller):
         self._mdl = model
@@ -50,6 +76,7 @@ class EditorService(SubController, Observer):
             configDir = f'{homeDir}/{self.INI_FILEPATH}'
         except:
             configDir = '.'
+        self._configDir = configDir
         self.configuration = self._mdl.nvService.new_configuration(
             settings=self.SETTINGS,
             options=self.OPTIONS,
@@ -58,21 +85,49 @@ class EditorService(SubController, Observer):
         self.configuration.read()
         prefs.update(self.configuration.settings)
         prefs.update(self.configuration.options)
+        prefs.reset_changed()
+        self._saveJob = None
+        prefs.add_change_listener(self._schedule_saving)
 
-        # Set window icon.
-        try:
-            path = os.path.dirname(sys.argv[0])
-            if not path:
-                path = '.'
-            self.icon = tk.PhotoImage(file=f'{path}/icons/{ICON}.png')
-        except:
-            self.icon = None
+        # Share the icon, the fonts, and the colors between the windows.
+        self.resources = ResourceCache(self._ui.root)
+        self.resources.set_font(prefs['editor_font'], int(prefs['font_size']))
+        self.resources.set_colors(
+            prefs['color_fg'],
+            prefs['color_bg'],
+            prefs['color_xml_tag'],
+        )
 
         self._sectionEditors = {}
         # editor windows
         # key: str -- Section ID
         # value:  reference to the EditorView instance
 
+        self._chapterEditors = {}
+        # chapter editor windows
+        # key: str -- Chapter ID
+        # value:  reference to the ChapterView instance
+
+        self._viewPool = []
+        # hidden, pre-built EditorView instances
+        self._poolJob = None
+
+        self._textCache = TextCache()
+        # section texts prepared for display
+        self._prefetchJob = None
+
+        self._executor = None
+        # thread pool for background tasks; created when needed
+        self._replaceJob = None
+        self._replaceFuture = None
+
+        self._journal = None
+        # autosave journal of the open project; created when needed
+        self._journalJob = None
+
+        self._refreshJob = None
+        # pending check for deleted sections and chapters
+
         # Register to be refreshed when a section is deleted.
         self._mdl.add_observer(self)
 
@@ -81,6 +136,32 @@ class EditorService(SubController, Observer):
             value=int(prefs['color_mode']),
         )
         EditorBox.colorXmlTag = prefs['color_xml_tag']
+        EditorBox.highlightDelay = int(prefs['highlight_delay'])
+        EditorBox.lazyHighlighting = prefs['lazy_highlighting']
+        EditorBox.maxUndoSteps = int(prefs['max_undo_steps'])
+        EditorBox.maxUndoBytes = int(prefs['max_undo_bytes'])
+        EditorBox.windowLines = int(prefs['window_lines'])
+
+    def change_font_size(self, increment):
+        """Change the font size of all editor windows.
+        
+        Positional arguments:
+            increment: int -- Points to add; may be negative.
+        """
+        prefs['font_size'] = max(
+            self._MIN_FONT_SIZE,
+            int(prefs['font_size']) + increment,
+        )
+        self.resources.set_font(prefs['editor_font'], prefs['font_size'])
+
+    def close_chapter_window(self, chId):
+        try:
+            if self._chapterEditors[chId].isOpen:
+                self._chapterEditors[chId].on_quit()
+            if not self._chapterEditors[chId].isOpen:
+                del self._chapterEditors[chId]
+        except KeyError:
+            pass
 
     def close_editor_window(self, nodeId):
         try:
@@ -91,23 +172,155 @@ class EditorService(SubController, Observer):
             pass
 
     def on_close(self):
-        """Close all open section editor windows."""
-        for scId in self._sectionEditors:
-            if self._sectionEditors[scId].isOpen:
-                self._sectionEditors[scId].on_quit()
+        """Close all open section and chapter editor windows.
+        
+        Check the changed editor texts in the thread pool,
+        ask once for all windows, and apply the confirmed changes.
+        Windows with invalid changes are kept open.
+        Drop a project-wide replacement in progress.
+        """
+        self._cancel_replacement()
+        openEditors = {}
+        for scId, editor in self._sectionEditors.items():
+            if editor.isOpen:
+                openEditors[scId] = editor
+        scIds = []
+        snapshots = []
+        contents = []
+        owners = []
+        # chapter ID of each text; None for section editor windows
+        for scId, editor in openEditors.items():
+            if scId in self._mdl.novel.sections and editor.has_changed():
+                scIds.append(scId)
+                snapshots.append(editor.get_snapshot())
+                contents.append(self._mdl.novel.sections[scId].sectionContent)
+                owners.append(None)
+        changes = {}
+        errors = {}
+        keptSections = set()
+        keptChapters = set()
+        # IDs of the windows to be kept open
+        for chId, chapterView in self._chapterEditors.items():
+            if not (chapterView.isOpen and chapterView.has_changed()):
+                continue
+
+            for scId, (text, loadedContent) in (
+                chapterView.get_changed_texts().items()
+            ):
+                section = self._mdl.novel.sections.get(scId, None)
+                if section is None:
+                    continue
+
+                if (section.sectionContent != loadedContent
+                    or scId in scIds
+                ):
+                    errors[scId] = _('The section has been changed elsewhere')
+                    keptChapters.add(chId)
+                    continue
+
+                scIds.append(scId)
+                snapshots.append(text)
+                contents.append(loadedContent)
+                owners.append(chId)
+        if scIds:
+            for owner, (scId, newContent, error) in zip(
+                owners,
+                self._get_executor().map(
+                    self._check_snapshot,
+                    scIds,
+                    snapshots,
+                    contents,
+                ),
+            ):
+                if error is not None:
+                    errors[scId] = error
+                    if owner is None:
+                        keptSections.add(scId)
+                    else:
+                        keptChapters.add(owner)
+                elif newContent is not None:
+                    changes[scId] = newContent
+        if (changes or errors) and self._ask_for_applying(changes, errors):
+            for scId, newContent in changes.items():
+                self._mdl.novel.sections[scId].sectionContent = newContent
+        else:
+            keptSections.clear()
+            keptChapters.clear()
+        for scId, editor in openEditors.items():
+            if scId in keptSections:
+                # Keep the window open with the changes to be fixed.
+                editor.lift()
+                continue
+
+            editor.reset_changed()
+            editor.on_quit()
+        for chId, chapterView in list(self._chapterEditors.items()):
+            if chId in keptChapters:
+                chapterView.lift()
+                continue
+
+            chapterView.reset_changed()
+            self.close_chapter_window(chId)
+        if not (keptSections or keptChapters):
+            self._close_journal()
 
     def on_quit(self):
         """Save project specific configuration."""
         self.on_close()
+        self._close_journal()
+        if self._poolJob is not None:
+            self._ui.root.after_cancel(self._poolJob)
+        if self._refreshJob is not None:
+            self._ui.root.after_cancel(self._refreshJob)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        while self._viewPool:
+            self._viewPool.pop().destroy()
         prefs['color_mode'] = EditorView.colorModeVar.get()
+        if self._saveJob is not None:
+            self._ui.root.after_cancel(self._saveJob)
+        self._save_configuration()
 
-        #--- Save configuration
-        for keyword in prefs:
-            if keyword in self.configuration.options:
-                self.configuration.options[keyword] = prefs[keyword]
-            elif keyword in self.configuration.settings:
-                self.configuration.settings[keyword] = prefs[keyword]
-        self.configuration.write()
+    def open_chapter_window(self):
+        """Create a window editing all sections of the selected chapter.
+        
+        If a section is selected, edit the chapter containing it.
+        """
+        try:
+            nodeId = self._ui.selectedNode
+        except IndexError:
+            # Nothing selected
+            return
+
+        if nodeId.startswith(SECTION_PREFIX):
+            chId = self._ui.tv.tree.parent(nodeId)
+        elif nodeId.startswith(CHAPTER_PREFIX):
+            chId = nodeId
+        else:
+            return
+
+        if self._ctrl.isLocked:
+            self._ui.show_info(
+                message=_('Cannot edit sections'),
+                detail=f"{_('The project is locked')}.",
+                title=FEATURE,
+            )
+            return
+
+        if (chId in self._chapterEditors
+            and self._chapterEditors[chId].isOpen
+        ):
+            self._chapterEditors[chId].lift()
+            return
+
+        self._chapterEditors[chId] = ChapterView(
+            self._mdl,
+            self._ui,
+            self._ctrl,
+            chId,
+            self,
+            icon=self.resources.get_icon()
+        )
 
     def open_editor_window(self):
         """Create a section editor window 
@@ -116,45 +329,501 @@ class EditorService(SubController, Observer):
         """
         try:
             nodeId = self._ui.selectedNode
-            if nodeId.startswith(SECTION_PREFIX):
-                if self._mdl.novel.sections[nodeId].scType > 1:
-                    return
-
-                # A section is selected
-                if self._ctrl.isLocked:
-                    self._ui.show_info(
-                        message=_('Cannot edit sections'),
-                        detail=f"{_('The project is locked')}.",
-                        title=FEATURE,
-                    )
-                    return
-
-                if (nodeId in self._sectionEditors
-                    and self._sectionEditors[nodeId].isOpen
-                ):
-                    self._sectionEditors[nodeId].lift()
-                    return
+            if not self._is_editable(nodeId):
+                return
 
-                self._sectionEditors[nodeId] = EditorView(
-                    self._mdl,
-                    self._ui,
-                    self._ctrl,
-                    nodeId,
-                    self,
-                    icon=self.icon
-                )
+            if (nodeId in self._sectionEditors
+                and self._sectionEditors[nodeId].isOpen
+            ):
+                self._sectionEditors[nodeId].lift()
+                return
+
+            if self._viewPool:
+                self._sectionEditors[nodeId] = self._viewPool.pop()
+                self._sectionEditors[nodeId].open_section(nodeId)
+                self._schedule_pool_refill()
+                return
+
+            self._sectionEditors[nodeId] = EditorView(
+                self._mdl,
+                self._ui,
+                self._ctrl,
+                nodeId,
+                self,
+                icon=self.resources.get_icon()
+            )
+            # Pre-build the next editor window when idle.
+            self._schedule_pool_refill()
 
         except IndexError:
             # Nothing selected
             pass
 
+    def replace_in_project(self):
+        """Find and replace text in all sections without editor windows.
+        
+        The section contents are processed in a worker thread.
+        The changes are applied in one pass after confirmation.
+        Sections that would not be well-formed after replacing,
+        or that have been edited in the meantime, are left untouched.
+        """
+        if self._replaceJob is not None:
+            # A replacement is already being prepared.
+            return
+
+        if self._ctrl.isLocked:
+            self._ui.show_info(
+                message=_('Cannot edit sections'),
+                detail=f"{_('The project is locked')}.",
+                title=FEATURE,
+            )
+            return
+
+        searchTerm = simpledialog.askstring(
+            FEATURE,
+            _('Find in all sections'),
+            parent=self._ui.root,
+        )
+        if not searchTerm:
+            return
+
+        replacement = simpledialog.askstring(
+            FEATURE,
+            f'{_("Replace")} "{searchTerm}" {_("with")}',
+            parent=self._ui.root,
+        )
+        if replacement is None:
+            return
+
+        contents = {}
+        for scId, section in self._mdl.novel.sections.items():
+            if section.scType <= 1 and section.sectionContent:
+                contents[scId] = section.sectionContent
+        replacer = SectionReplacer(
+            re.compile(re.escape(searchTerm)),
+            replacement.replace('\\', r'\\'),
+        )
+        self._replaceFuture = self._get_executor().submit(
+            replacer.run,
+            contents,
+        )
+        self._replaceJob = self._ui.root.after(
+            self._POLL_INTERVAL,
+            self._poll_replacement,
+            contents,
+        )
+
+    def set_color_mode(self, colorMode):
+        """Apply a color mode to all editor windows.
+        
+        Positional arguments:
+            colorMode: int -- Index of EditorView.COLOR_MODES.
+        """
+        (
+            __,
+            prefs['color_fg'],
+            prefs['color_bg'],
+            prefs['color_xml_tag'],
+        ) = EditorView.COLOR_MODES[colorMode]
+        self.resources.set_colors(
+            prefs['color_fg'],
+            prefs['color_bg'],
+            prefs['color_xml_tag'],
+        )
+
+    def swap_section(self, scId, nodeId):
+        """Load another section into the editor window of section scId.
+        
+        Positional arguments:
+            scId: str -- ID of the section currently edited.
+            nodeId: str -- ID of the selected tree node to be edited.
+
+        Keep the window with its menus and widgets.
+        If nodeId has an own editor window, or cannot be edited,
+        close the window and proceed as with a new editor window.
+        """
+        hasOwnWindow = (
+            nodeId in self._sectionEditors
+            and self._sectionEditors[nodeId].isOpen
+        )
+        if (scId in self._sectionEditors
+            and not hasOwnWindow
+            and self._is_editable(nodeId, quiet=True)
+        ):
+            editor = self._sectionEditors.pop(scId)
+            self._sectionEditors[nodeId] = editor
+            editor.load_section(nodeId)
+            editor.lift()
+            return
+
+        self.close_editor_window(scId)
+        self.open_editor_window()
+
+    def get_journal(self):
+        """Return the autosave journal of the open project.
+        
+        Return None, if the project has no file yet.
+        """
+        try:
+            projectPath = self._mdl.prjFile.filePath
+        except AttributeError:
+            projectPath = None
+        if not projectPath:
+            self._close_journal()
+            return None
+
+        projectHash = hashlib.sha1(projectPath.encode('utf-8')).hexdigest()
+        filePath = f'{self._configDir}/{self.JOURNAL_DIR}/{projectHash}.jsonl'
+        if self._journal is not None and self._journal.filePath != filePath:
+            self._close_journal()
+        if self._journal is None:
+            self._journal = EditJournal(filePath, self._mdl.novel.sections)
+            self._journalJob = self._ui.root.after(
+                self._JOURNAL_INTERVAL,
+                self._flush_journal,
+            )
+        return self._journal
+
+    def get_prepared_text(self, scId):
+        """Return the section text prepared for display, if cached.
+        
+        Otherwise, return None.
+        """
+        return self._textCache.get(
+            scId,
+            self._mdl.novel.sections[scId].sectionContent,
+        )
+
+    def prefetch_neighbours(self, scId):
+        """Prepare the texts of the sections next to scId when idle."""
+        if self._prefetchJob is not None:
+            self._ui.root.after_cancel(self._prefetchJob)
+        self._prefetchJob = self._ui.root.after_idle(
+            self._prefetch_texts,
+            scId,
+        )
+
     def refresh(self):
         """Close editor window in case the corresmpnding section is deleted.
         
+        Also close chapter editor windows of deleted chapters.
+        Also drop prefetched texts of deleted or changed sections.
+        The check is made when idle, so a bulk update of the model
+        is checked only once.
         Overrides the superclass method.
         """
+        if self._refreshJob is None:
+            self._refreshJob = self._ui.root.after_idle(self._refresh_editors)
+
+    def _apply_replacements(self, contents, changes):
+        # Assign the new contents to the sections.
+        # Skip sections changed since the contents were read,
+        # and sections with unapplied changes in an editor window.
+        # Return the number of skipped sections.
+        skipped = 0
+        chapterViews = []
+        for chapterView in self._chapterEditors.values():
+            if chapterView.isOpen:
+                chapterViews.append(chapterView)
+        for scId, (newContent, __) in changes.items():
+            section = self._mdl.novel.sections.get(scId, None)
+            editor = self._sectionEditors.get(scId, None)
+            isEdited = editor is not None and editor.isOpen
+            if (section is None
+                or section.sectionContent != contents[scId]
+                or (isEdited and editor.has_changed())
+                or any(view.has_changed(scId) for view in chapterViews)
+            ):
+                skipped += 1
+                continue
+
+            section.sectionContent = newContent
+            if isEdited:
+                editor.load_section(scId)
+            for chapterView in chapterViews:
+                chapterView.load_section(scId)
+        return skipped
+
+    def _ask_for_applying(self, changes, errors):
+        # Ask once whether to apply the changes of the editor windows.
+        # Return True if the changes may be applied.
+        details = []
+        if changes:
+            details.append(f'{_("Changed sections")}:')
+            for scId in changes:
+                details.append(self._mdl.novel.sections[scId].title)
+        if errors:
+            details.append(
+                f'{_("Invalid changes")}'
+                f' ({_("the windows are kept open")}):'
+            )
+            for scId, error in errors.items():
+                details.append(
+                    f'{self._mdl.novel.sections[scId].title} ({error})'
+                )
+        if not self._ui.ask_yes_no(
+            message=_('Apply section changes?'),
+            detail='\n'.join(details),
+            title=FEATURE,
+        ):
+            return False
+
+        if changes and self._ctrl.isLocked:
+            if not self._ui.ask_yes_no(
+                message=_('Unlock and apply changes?'),
+                detail=_('Cannot apply section changes as long as the project is locked.'),
+                title=FEATURE,
+            ):
+                return False
+
+            self._ctrl.unlock()
+        return True
+
+    def _cancel_replacement(self):
+        # Drop a project-wide replacement in progress, if any.
+        if self._replaceJob is not None:
+            self._ui.root.after_cancel(self._replaceJob)
+            self._replaceJob = None
+        if self._replaceFuture is not None:
+            self._replaceFuture.cancel()
+            self._replaceFuture = None
+
+    @staticmethod
+    def _check_snapshot(scId, snapshot, sectionContent):
+        # Compare and validate an editor text; run in the thread pool.
+        # snapshot is a TextDocument, or the text of a chapter window.
+        # Return a (scId, newContent, error) tuple.
+        # newContent is None if the text is unchanged or invalid.
+        if isinstance(snapshot, str):
+            buffer = snapshot
+        else:
+            buffer = snapshot.get_text()
+        newContent = EditorBox.get_section_content(buffer)
+        if newContent == sectionContent or not (newContent or sectionContent):
+            return scId, None, None
+
+        error = XmlValidator.get_parse_error([buffer])
+        if error is not None:
+            issue, lineNumber, column = error
+            return scId, None, f'{issue}: line {lineNumber} column {column}'
+
+        return scId, newContent, None
+
+    def _close_journal(self):
+        # Write the pending journal records and stop journaling.
+        if self._journal is None:
+            return
+
+        self._ui.root.after_cancel(self._journalJob)
+        self._journalJob = None
+        self._journal.close()
+        self._journal = None
+
+    def _flush_journal(self):
+        # Pass the editor changes to the journal writer, periodically.
+        self._journal.flush()
+        self._journalJob = self._ui.root.after(
+            self._JOURNAL_INTERVAL,
+            self._flush_journal,
+        )
+
+    def _get_executor(self):
+        # Return the thread pool for background tasks.
+        if self._executor is None:
+            # Import here, since concurrent.futures pulls in logging,
+            # which would slow down novelibre's start.
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor()
+        return self._executor
+
+    def _is_editable(self, nodeId, quiet=False):
+        # Return True if nodeId is a section that can be edited.
+        # Unless quiet, notify the user if the project is locked.
+        if not nodeId.startswith(SECTION_PREFIX):
+            return False
+
+        if self._mdl.novel.sections[nodeId].scType > 1:
+            return False
+
+        if self._ctrl.isLocked:
+            if not quiet:
+                self._ui.show_info(
+                    message=_('Cannot edit sections'),
+                    detail=f"{_('The project is locked')}.",
+                    title=FEATURE,
+                )
+            return False
+
+        return True
+
+    def _poll_replacement(self, contents):
+        # Wait for the worker thread, then ask for confirmation
+        # and apply the replacements.
+        if not self._replaceFuture.done():
+            self._replaceJob = self._ui.root.after(
+                self._POLL_INTERVAL,
+                self._poll_replacement,
+                contents,
+            )
+            return
+
+        self._replaceJob = None
+        changes, errors = self._replaceFuture.result()
+        self._replaceFuture = None
+        if not changes and not errors:
+            self._ui.show_info(
+                message=_('No matches found'),
+                title=FEATURE,
+            )
+            return
+
+        replacements = sum(count for __, count in changes.values())
+        details = [
+            f'{replacements} {_("replacements")}'
+            f' {_("in")} {len(changes)} {_("sections")}.'
+        ]
+        if errors:
+            details.append(
+                f'{_("Sections left untouched")}'
+                f' {_("because the result would not be well-formed XML")}:'
+            )
+            for scId, error in errors.items():
+                section = self._mdl.novel.sections.get(scId, None)
+                if section is None:
+                    # Deleted in the meantime.
+                    continue
+
+                details.append(f'{section.title} ({error})')
+        if not changes:
+            self._ui.show_error(
+                message=_('Cannot replace'),
+                detail='\n'.join(details),
+            )
+            return
+
+        if not self._ui.ask_yes_no(
+            message=_('Apply the replacements?'),
+            detail='\n'.join(details),
+            title=FEATURE,
+        ):
+            return
+
+        if self._ctrl.isLocked:
+            self._ui.show_info(
+                message=_('Cannot edit sections'),
+                detail=f"{_('The project is locked')}.",
+                title=FEATURE,
+            )
+            return
+
+        skipped = self._apply_replacements(contents, changes)
+        if skipped:
+            self._ui.show_info(
+                message=_('Some sections were left untouched'),
+                detail=(
+                    f'{skipped} {_("sections")}'
+                    f' {_("have been edited in the meantime")}.'
+                ),
+                title=FEATURE,
+            )
+
+    def _prefetch_texts(self, scId):
+        # Put the prepared texts of the sections before and after scId
+        # into the cache, so Next/Previous do not need to tokenize.
+        self._prefetchJob = None
+        if not scId in self._mdl.novel.sections:
+            return
+
+        for nodeId in (
+            self._ui.tv.next_node(scId),
+            self._ui.tv.prev_node(scId),
+        ):
+            if not nodeId or not nodeId in self._mdl.novel.sections:
+                continue
+
+            content = self._mdl.novel.sections[nodeId].sectionContent
+            if self._textCache.get(nodeId, content) is None:
+                self._textCache.put(
+                    nodeId,
+                    content,
+                    EditorBox.prepare_text(content),
+                )
+
+    def _refill_pool(self):
+        # Build one hidden editor window per idle cycle
+        # until the pool is full.
+        self._poolJob = None
+        if len(self._viewPool) >= int(prefs['pool_size']):
+            return
+
+        self._viewPool.append(
+            EditorView(
+                self._mdl,
+                self._ui,
+                self._ctrl,
+                None,
+                self,
+                icon=self.resources.get_icon()
+            )
+        )
+        self._schedule_pool_refill()
+
+    def _refresh_editors(self):
+        # Close the windows of deleted sections and chapters.
+        self._refreshJob = None
+        if self._mdl.novel is None:
+            return
+
+        self._textCache.prune(self._mdl.novel.sections)
+        if not (self._sectionEditors or self._chapterEditors):
+            return
+
         for scId in list(self._sectionEditors):
             if not scId in self._mdl.novel.sections:
                 if self._sectionEditors[scId].isOpen:
                     self._sectionEditors[scId].on_quit()
                 del self._sectionEditors[scId]
+        for chId in list(self._chapterEditors):
+            if not chId in self._mdl.novel.chapters:
+                self.close_chapter_window(chId)
+
+    def _save_configuration(self):
+        # Write the preferences to the configuration file, if changed.
+        # Write a temporary file first, so as not to leave
+        # a truncated file in case of failure.
+        self._saveJob = None
+        if not prefs.has_changed():
+            return
+
+        for keyword in prefs:
+            if keyword in self.configuration.options:
+                self.configuration.options[keyword] = prefs[keyword]
+            elif keyword in self.configuration.settings:
+                self.configuration.settings[keyword] = prefs[keyword]
+        iniPath = f'{self._configDir}/{self.INI_FILENAME}'
+        tempPath = f'{iniPath}.tmp'
+        try:
+            self._mdl.nvService.new_configuration(
+                settings=self.configuration.settings,
+                options=self.configuration.options,
+                filePath=tempPath,
+            ).write()
+            os.replace(tempPath, iniPath)
+        except OSError:
+            return
+
+        prefs.reset_changed()
+
+    def _schedule_pool_refill(self):
+        if self._poolJob is None and int(prefs['pool_size']) > 0:
+            self._poolJob = self._ui.root.after_idle(self._refill_pool)
+
+    def _schedule_saving(self):
+        # Restart the debounce timer, so that changes made at once,
+        # e.g. by closing several windows, are saved together.
+        if self._saveJob is not None:
+            self._ui.root.after_cancel(self._saveJob)
+        self._saveJob = self._ui.root.after(
+            self._SAVE_DELAY,
+            self._save_configuration,
+        )
@@ -4,17 +4,21 @@ Copyright (c) Peter Triesberger
 For further information see https://github.com/peter88213/nv_editor
 License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
 """
+import re
+from tkinter import simpledialog
 from tkinter import ttk
 
 from nveditor.editor_box import EditorBox
+from nveditor.find_dialog import FindDialog
+from nveditor.journal_recorder import JournalRecorder
 from nveditor.nveditor_globals import FEATURE
 from nveditor.nveditor_globals import prefs
 from nveditor.nveditor_locale import _
 from nveditor.platform.platform_settings import KEYS
 from nveditor.platform.platform_settings import PLATFORM
+from nveditor.word_counter import WordCounter
 from nvlib.controller.sub_controller import SubController
 import tkinter as tk
-import xml.etree.ElementTree as ET
 from nveditor.nveditor_globals import HELP_PAGE
 
 
@@ -24,7 +28,12 @@ class EditorView(tk.Toplevel, SubController):
     Public instance methods:
         lift() -- Bring window to the foreground 
                   and set the focus to the editor box.
+        get_snapshot() -- Return a copy of the editor text.
+        has_changed() -- Return True if the text has unapplied changes.
+        load_section(scId) -- Replace the editor content with another section.
+        open_section(scId) -- Show a pre-built window with a section.
         on_quit() -- Exit the editor. Apply changes, if possible.
+        reset_changed() -- Consider the text as unchanged.
     """
     colorModeVar = None
     # to be overwritten by the client with tk.IntVar()
@@ -56,6 +65,8 @@ class EditorView(tk.Toplevel, SubController):
         ),
     ]
     # (name, foreground, background) tuples for color modes.
+    _RECOVERY_INTERVAL = 100
+    # Milliseconds between checks whether the journal is read.
 
     def __init__(self, model, view, controller, scId, service, icon=None):
         self._mdl = model
@@ -63,10 +74,15 @@ class EditorView(tk.Toplevel, SubController):
         self._ctrl = controller
         self._scId = scId
         self._service = service
-        self._section = self._mdl.novel.sections[scId]
+        self._findDialog = None
+        if scId is not None:
+            self._section = self._mdl.novel.sections[scId]
 
         # Create an independent editor window.
         super().__init__()
+        if scId is None:
+            # Build the window hidden, to be shown with open_section().
+            self.withdraw()
         self.geometry(prefs['win_geometry'])
         if icon:
             self.iconphoto(False, icon)
@@ -80,24 +96,31 @@ class EditorView(tk.Toplevel, SubController):
             self,
             wrap='word',
             undo=True,
-            autoseparators=True,
             spacing1=prefs['paragraph_spacing'],
             spacing2=prefs['line_spacing'],
-            maxundo=-1,
             padx=prefs['margin_x'],
             pady=prefs['margin_y'],
-            font=(
-                prefs['editor_font'],
-                prefs['font_size'],
-            ),
         )
         self._sectionEditor.pack(expand=True, fill='both')
         self._sectionEditor.pack_propagate(0)
-        self._set_editor_colors()
+        self._set_editor_style()
+        self._service.resources.add_listener(self._set_editor_style)
+        self._journalRecorder = JournalRecorder()
+        self._sectionEditor.add_line_listener(self._journalRecorder)
 
         # Add a status bar to the editor window.
         self._statusBar = tk.Label(self, text='', anchor='w', padx=5, pady=2)
         self._statusBar.pack(expand=False, side='left')
+        self._statusJob = None
+        self._recoveryJob = None
+        self._storedContent = None
+        self._storedWords = 0
+        # word count of the section content, for showing the difference
+        self._wordCounter = None
+        if prefs['live_wordcount']:
+            self._wordCounter = WordCounter()
+            self._sectionEditor.add_line_listener(self._wordCounter)
+            self._sectionEditor.add_change_listener(self._schedule_status)
 
         # Add buttons to the bottom line.
         ttk.Button(
@@ -117,7 +140,8 @@ class EditorView(tk.Toplevel, SubController):
         ).pack(side='right')
 
         # Load the section content into the text editor.
-        self._load_section()
+        if scId is not None:
+            self._load_section()
 
         #--- Configure the user interface.
 
@@ -180,6 +204,15 @@ class EditorView(tk.Toplevel, SubController):
                 command=self._change_editor_colors,
                 value=i,
             )
+        self._viewMenu.add_separator()
+        self._viewMenu.add_command(
+            label=_('Increase font size'),
+            command=lambda: self._service.change_font_size(1),
+        )
+        self._viewMenu.add_command(
+            label=_('Decrease font size'),
+            command=lambda: self._service.change_font_size(-1),
+        )
 
         # Add an "Edit" Submenu to the editor window.
         self._editMenu = tk.Menu(self._mainMenu, tearoff=0)
@@ -201,6 +234,12 @@ class EditorView(tk.Toplevel, SubController):
             accelerator=KEYS.PASTE[1],
             command=lambda: self._sectionEditor.event_generate("<<Paste>>"),
         )
+        self._editMenu.add_separator()
+        self._editMenu.add_command(
+            label=_('Find and replace'),
+            accelerator=KEYS.FIND[1],
+            command=self._open_find_dialog,
+        )
 
         # Add a "Format" Submenu to the editor window.
         self._formatMenu = tk.Menu(self._mainMenu, tearoff=0)
@@ -223,6 +262,19 @@ class EditorView(tk.Toplevel, SubController):
             accelerator=KEYS.PLAIN[1],
             command=self._sectionEditor.plain,
         )
+        self._formatMenu.add_separator()
+        self._formatMenu.add_command(
+            label=_('Emphasize all occurrences...'),
+            command=lambda: self._format_occurrences(tag='em'),
+        )
+        self._formatMenu.add_command(
+            label=_('Strongly emphasize all occurrences...'),
+            command=lambda: self._format_occurrences(tag='strong'),
+        )
+        self._formatMenu.add_command(
+            label=_('Make all occurrences plain...'),
+            command=self._format_occurrences,
+        )
 
         # Help
         self._mainMenu.add_command(
@@ -235,9 +287,9 @@ class EditorView(tk.Toplevel, SubController):
             (KEYS.OPEN_HELP[0], self._open_help),
             (KEYS.QUIT_PROGRAM[0], self._request_closing),
             (KEYS.APPLY_CHANGES[0], self._apply_changes),
-            ('<space>', self._sectionEditor.colorize),
             (KEYS.SPLIT_SECTION[0], self._split_section),
             (KEYS.CREATE_SECTION[0], self._create_section),
+            (KEYS.FIND[0], self._open_find_dialog),
             (KEYS.ITALIC[0], self._sectionEditor.emphasis),
             (KEYS.BOLD[0], self._sectionEditor.strong_emphasis),
             (KEYS.PLAIN[0], self._sectionEditor.plain),
@@ -258,11 +310,34 @@ class EditorView(tk.Toplevel, SubController):
 
         self.protocol("WM_DELETE_WINDOW", self._request_closing)
 
+        if scId is None:
+            self.isOpen = False
+            return
+
         self.lift()
         self.update_idletasks()
         self.geometry(prefs['win_geometry'])
         self.isOpen = True
 
+    def destroy(self):
+        """Stop following the shared style, and destroy the window.
+        
+        Extends the superclass method.
+        """
+        self._service.resources.remove_listener(self._set_editor_style)
+        super().destroy()
+
+    def get_snapshot(self):
+        """Return a copy of the editor text, for checking elsewhere.
+        
+        The copy can be read by a worker thread.
+        """
+        return self._sectionEditor.get_snapshot()
+
+    def has_changed(self):
+        """Return True if the text has unapplied changes."""
+        return self._sectionEditor.has_changed()
+
     def lift(self):
         """Bring window to the foreground and set the focus to the editor box.
         
@@ -273,6 +348,18 @@ class EditorView(tk.Toplevel, SubController):
         super().lift()
         self._sectionEditor.focus()
 
+    def load_section(self, scId):
+        """Replace the editor content with the content of another section.
+        
+        Positional arguments:
+            scId: str -- ID of the section to be edited.
+            
+        Menus, widgets, and fonts are kept; the undo stack is cleared.
+        """
+        self._scId = scId
+        self._section = self._mdl.novel.sections[scId]
+        self._load_section()
+
     def on_quit(self, event=None):
         """Exit the editor. Apply changes, if possible."""
         if not self._apply_changes_after_asking():
@@ -281,14 +368,41 @@ class EditorView(tk.Toplevel, SubController):
             # due to malformed XML to be fixed before saving
 
         prefs['win_geometry'] = self.winfo_geometry()
+        self._journalRecorder.stop()
+        if self._statusJob is not None:
+            self.after_cancel(self._statusJob)
+            self._statusJob = None
+        if self._recoveryJob is not None:
+            self.after_cancel(self._recoveryJob)
+            self._recoveryJob = None
         self.destroy()
         self.isOpen = False
 
+    def open_section(self, scId):
+        """Show a window built without a section, editing section scId.
+        
+        Positional arguments:
+            scId: str -- ID of the section to be edited.
+        """
+        self.load_section(scId)
+        self.deiconify()
+        self.lift()
+        self.update_idletasks()
+        self.geometry(prefs['win_geometry'])
+        self.isOpen = True
+
+    def reset_changed(self):
+        """Consider the text as unchanged, so closing does not ask."""
+        self._sectionEditor.reset_changed()
+
     def _apply_changes(self, event=None):
         # Transfer the editor content to the project, if modified.
         if not self._scId in self._mdl.novel.sections:
             return
 
+        if not self._sectionEditor.has_changed():
+            return
+
         try:
             self._sectionEditor.check_validity()
         except ValueError as ex:
@@ -310,6 +424,9 @@ class EditorView(tk.Toplevel, SubController):
         if not self._scId in self._mdl.novel.sections:
             return True
 
+        if not self._sectionEditor.has_changed():
+            return True
+
         sectionText = self._sectionEditor.get_text()
         if sectionText or self._section.sectionContent:
             if self._section.sectionContent != sectionText:
@@ -363,6 +480,32 @@ class EditorView(tk.Toplevel, SubController):
         self._load_next()
         return newId
 
+    def _format_occurrences(self, tag=''):
+        # Format all occurrences of a search term in one undo step.
+        # Without a tag, remove the markup.
+        try:
+            initialValue = self._sectionEditor.get('sel.first', 'sel.last')
+        except tk.TclError:
+            initialValue = ''
+        searchTerm = simpledialog.askstring(
+            FEATURE,
+            _('Text to be formatted'),
+            initialvalue=initialValue.split('\n')[0],
+            parent=self,
+        )
+        self.lift()
+        if not searchTerm:
+            return
+
+        if not self._sectionEditor.format_matches(re.escape(searchTerm), tag):
+            self._ui.show_info(
+                message=_('No occurrences changed'),
+                detail=f'"{searchTerm}"',
+                title=FEATURE,
+                parent=self,
+            )
+            self.lift()
+
     def _load_next(self, event=None):
         # Load the next section in the tree.
         if not self._apply_changes_after_asking():
@@ -371,8 +514,7 @@ class EditorView(tk.Toplevel, SubController):
         nextNode = self._ui.tv.next_node(self._scId)
         if nextNode:
             self._ui.tv.go_to_node(nextNode)
-            self._request_closing()
-            self._service.open_editor_window()
+            self._service.swap_section(self._scId, nextNode)
 
     def _load_prev(self, event=None):
         # Load the previous section in the tree.
@@ -382,8 +524,7 @@ class EditorView(tk.Toplevel, SubController):
         prevNode = self._ui.tv.prev_node(self._scId)
         if prevNode:
             self._ui.tv.go_to_node(prevNode)
-            self._request_closing()
-            self._service.open_editor_window()
+            self._service.swap_section(self._scId, prevNode)
 
     def _load_section(self):
         # Load the section content into the text editor.
@@ -391,33 +532,92 @@ class EditorView(tk.Toplevel, SubController):
             f'{self._section.title} - {self._mdl.novel.title}'
             f', {_("Section")} ID {self._scId}'
         )
-        self._sectionEditor.set_text(self._section.sectionContent)
+        self._journalRecorder.stop()
+        if self._recoveryJob is not None:
+            self.after_cancel(self._recoveryJob)
+            self._recoveryJob = None
+        self._sectionEditor.set_text(
+            self._section.sectionContent,
+            self._service.get_prepared_text(self._scId),
+        )
+        journal = self._service.get_journal()
+        if journal is not None:
+            self._journalRecorder.start(
+                journal,
+                self._scId,
+                self._section.sectionContent,
+            )
+            self._offer_recovery()
+        self._service.prefetch_neighbours(self._scId)
+
+    def _offer_recovery(self):
+        # Offer restoring a lost session, as soon as the journal is read.
+        self._recoveryJob = None
+        journal = self._service.get_journal()
+        if journal is None:
+            return
+
+        if not journal.is_ready():
+            self._recoveryJob = self.after(
+                self._RECOVERY_INTERVAL,
+                self._offer_recovery,
+            )
+            return
+
+        recoveredContent = journal.get_recovered_content(
+            self._scId,
+            self._section.sectionContent,
+        )
+        if recoveredContent is not None:
+            self._recover(recoveredContent)
+
+    def _open_find_dialog(self, event=None):
+        # Open the find/replace dialog, or bring it to the foreground.
+        # Search for the selected text, if any.
+        if self._findDialog is None or not self._findDialog.winfo_exists():
+            self._findDialog = FindDialog(self, self._sectionEditor)
+        else:
+            self._findDialog.lift()
+        if self._sectionEditor.tag_ranges('sel'):
+            selection = self._sectionEditor.get('sel.first', 'sel.last')
+            self._findDialog.set_search_term(selection.split('\n')[0])
+        return 'break'
 
     def _open_help(self, event=None):
         self._ctrl.open_help(page=HELP_PAGE)
 
+    def _recover(self, sectionContent):
+        # Offer restoring the editor text of a lost session.
+        # Restore it as an undoable change, to be applied by the user.
+        if not self._ui.ask_yes_no(
+            message=_('Restore the unapplied changes of the last session?'),
+            title=FEATURE,
+            parent=self,
+        ):
+            return
+
+        displayText = EditorBox.prepare_text(
+            sectionContent,
+            withTags=False,
+        )[0]
+        with self._sectionEditor.undo_block():
+            self._sectionEditor.split_off('1.0')
+            self._sectionEditor.insert('1.0', displayText)
+
     def _request_closing(self, event=None):
         self._service.close_editor_window(self._scId)
         # making sure the service removes this instance from the list
 
     def _change_editor_colors(self):
-        cm = EditorView.colorModeVar.get()
-        (
-            __,
-            prefs['color_fg'],
-            prefs['color_bg'],
-            prefs['color_xml_tag'],
-        ) = self.COLOR_MODES[cm]
-        self._set_editor_colors()
-
-    def _set_editor_colors(self):
-        self._sectionEditor['fg'] = prefs['color_fg']
-        self._sectionEditor['bg'] = prefs['color_bg']
-        self._sectionEditor['insertbackground'] = prefs['color_fg']
-        self._sectionEditor.tag_configure(
-            self._sectionEditor.XML_TAG,
-            foreground=prefs['color_xml_tag'],
-        )
+        self._service.set_color_mode(EditorView.colorModeVar.get())
+
+    def _schedule_status(self):
+        # Update the status bar once the pending changes are processed.
+        if self._statusJob is None:
+            self._statusJob = self.after_idle(self._update_status)
+
+    def _set_editor_style(self):
+        self._sectionEditor.set_style(*self._service.resources.get_style())
 
     def _split_section(self, event=None):
         # Split a section at the cursor position.
@@ -444,10 +644,7 @@ class EditorView(tk.Toplevel, SubController):
             return
 
         # Verify that the split would produce a valid result.
-        try:
-            ET.fromstring(f"<a>{self._sectionEditor.get('1.0', 'insert')}</a>")
-            ET.fromstring(f"<a>{self._sectionEditor.get('insert', 'end')}</a>")
-        except:
+        if not self._sectionEditor.can_split():
             self._ui.show_error(
                 message=_('Cannot split the section at the cursor position'),
                 detail=f"{_('The result would not be well-formed XML')}.",
@@ -484,11 +681,7 @@ class EditorView(tk.Toplevel, SubController):
 
             # Cut the actual section's content from the cursor position
             # to the end.
-            newContent = self._sectionEditor.get_text(
-                'insert',
-                'end'
-            ).strip(' \n')
-            self._sectionEditor.delete('insert', 'end')
+            newContent = self._sectionEditor.split_off('insert')
             self._apply_changes()
 
             # Copy the section content to the new section.
@@ -524,7 +717,35 @@ class EditorView(tk.Toplevel, SubController):
             ):
                 self._ctrl.unlock()
                 self._section.sectionContent = sectionText
+                self._sectionEditor.reset_changed()
+                self._journalRecorder.rebase(
+                    self._section.sectionContent,
+                    self._sectionEditor.get_snapshot().get_lines(),
+                )
             self.lift()
         else:
             self._section.sectionContent = sectionText
-
+            self._sectionEditor.reset_changed()
+            self._journalRecorder.rebase(
+                self._section.sectionContent,
+                self._sectionEditor.get_snapshot().get_lines(),
+            )
+        if self._wordCounter is not None:
+            self._schedule_status()
+
+    def _update_status(self):
+        # Show the word and character counts on the status bar,
+        # and the words added since the section content was stored.
+        self._statusJob = None
+        sectionContent = self._section.sectionContent
+        if sectionContent is not self._storedContent:
+            self._storedContent = sectionContent
+            self._storedWords = WordCounter.count(sectionContent)[0]
+        words, characters = self._wordCounter.get_counts()
+        self._statusBar.config(
+            text=(
+                f'{words} {_("words")} '
+                f'({words - self._storedWords:+} {_("new")}) | '
+                f'{characters} {_("characters")}'
+            )
+        )
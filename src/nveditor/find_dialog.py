@@ -0,0 +1,176 @@
+"""Provide a find/replace dialog for the novelibre section editor.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+import re
+from tkinter import ttk
+
+from nveditor.nveditor_locale import _
+import tkinter as tk
+
+
+class FindDialog(tk.Toplevel):
+    """A non-modal find/replace dialog for an editor box.
+
+    Public methods:
+        close() -- Stop searching and close the dialog.
+        set_search_term(text) -- Start searching for text.
+    """
+    _SEARCH_DELAY = 300
+    # Debounce interval for searching while typing, in milliseconds.
+
+    def __init__(self, master, editorBox):
+        super().__init__(master)
+        self.transient(master)
+        self.title(_('Find and replace'))
+        self.resizable(False, False)
+        self._editor = editorBox
+        self._searchJob = None
+
+        self._searchTerm = tk.StringVar()
+        self._replacement = tk.StringVar()
+        self._isRegex = tk.BooleanVar(value=False)
+        self._matchCase = tk.BooleanVar(value=False)
+
+        ttk.Label(self, text=_('Find')).grid(
+            row=0,
+            column=0,
+            sticky='w',
+            padx=5,
+            pady=2,
+        )
+        self._searchEntry = ttk.Entry(
+            self,
+            textvariable=self._searchTerm,
+            width=40,
+        )
+        self._searchEntry.grid(row=0, column=1, columnspan=4, padx=5, pady=2)
+        ttk.Label(self, text=_('Replace')).grid(
+            row=1,
+            column=0,
+            sticky='w',
+            padx=5,
+            pady=2,
+        )
+        ttk.Entry(
+            self,
+            textvariable=self._replacement,
+            width=40,
+        ).grid(row=1, column=1, columnspan=4, padx=5, pady=2)
+        ttk.Checkbutton(
+            self,
+            text=_('Match case'),
+            variable=self._matchCase,
+        ).grid(row=2, column=1, columnspan=2, sticky='w', padx=5)
+        ttk.Checkbutton(
+            self,
+            text=_('Regular expression'),
+            variable=self._isRegex,
+        ).grid(row=2, column=3, columnspan=2, sticky='w', padx=5)
+        self._status = ttk.Label(self, text='')
+        self._status.grid(row=3, column=0, columnspan=5, sticky='w', padx=5)
+
+        buttons = [
+            (_('Previous'), self._find_previous),
+            (_('Next'), self._find_next),
+            (_('Replace'), self._replace),
+            (_('Replace all'), self._replace_all),
+            (_('Close'), self.close),
+        ]
+        for i, (label, command) in enumerate(buttons):
+            ttk.Button(
+                self,
+                text=label,
+                command=command,
+            ).grid(row=4, column=i, padx=2, pady=5)
+
+        for variable in (self._searchTerm, self._isRegex, self._matchCase):
+            variable.trace_add('write', self._schedule_search)
+        self.bind('<Return>', self._find_next)
+        self.bind('<Escape>', self.close)
+        self.protocol('WM_DELETE_WINDOW', self.close)
+        self._searchEntry.focus()
+
+    def close(self, event=None):
+        """Stop searching and close the dialog."""
+        if self._searchJob is not None:
+            self.after_cancel(self._searchJob)
+            self._searchJob = None
+        self._editor.clear_search()
+        self.destroy()
+
+    def set_search_term(self, text):
+        """Start searching for text, and select it in the entry field."""
+        self._searchTerm.set(text)
+        self._searchEntry.select_range(0, 'end')
+        self._searchEntry.focus()
+
+    def _find_next(self, event=None):
+        self._search()
+        self._editor.find_next()
+
+    def _find_previous(self, event=None):
+        self._search()
+        self._editor.find_next(backwards=True)
+
+    def _replace(self, event=None):
+        self._search()
+        self._editor.replace_match(self._get_replacement())
+        self._show_count()
+
+    def _replace_all(self, event=None):
+        self._search()
+        replacements = self._editor.replace_all(self._get_replacement())
+        self._status['text'] = f'{replacements} {_("replacements")}'
+
+    def _get_replacement(self):
+        # Return the replacement text as a re.sub() template.
+        replacement = self._replacement.get()
+        if self._isRegex.get():
+            return replacement
+
+        return replacement.replace('\\', r'\\')
+
+    def _schedule_search(self, *args):
+        # Restart the debounce timer, so the text is searched
+        # once typing pauses.
+        if self._searchJob is not None:
+            self.after_cancel(self._searchJob)
+        self._searchJob = self.after(self._SEARCH_DELAY, self._search)
+
+    def _search(self):
+        # Index and highlight the search hits, if the search has changed.
+        if self._searchJob is not None:
+            self.after_cancel(self._searchJob)
+            self._searchJob = None
+        else:
+            # The index is up to date.
+            return
+
+        searchTerm = self._searchTerm.get()
+        if not searchTerm:
+            self._editor.clear_search()
+            self._status['text'] = ''
+            return
+
+        if not self._isRegex.get():
+            searchTerm = re.escape(searchTerm)
+        if self._matchCase.get():
+            flags = 0
+        else:
+            flags = re.IGNORECASE
+        try:
+            self._editor.set_search(searchTerm, flags)
+        except re.error as ex:
+            self._editor.clear_search()
+            self._status['text'] = f'{_("Invalid regular expression")}: {ex}'
+            return
+
+        self._show_count()
+
+    def _show_count(self):
+        self._status['text'] = (
+            f'{self._editor.get_match_count()} {_("matches")}'
+        )
@@ -0,0 +1,113 @@
+"""Provide a class for recording the changes of an editor text.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+from nveditor.editor_box import EditorBox
+
+
+class JournalRecorder:
+    """Collect the changed lines of a section editor for the journal.
+
+    Public instance variables:
+        scId -- ID of the recorded section; None, if not recording.
+
+    Public methods:
+        start(journal, scId, sectionContent) -- Start recording a section.
+        rebase(sectionContent, lines) -- Record the applied changes.
+        stop() -- Stop recording.
+        replace_lines(firstLine, lastLine, newLines) -- Record a change.
+        flush() -- Pass the collected changes to the journal.
+
+    Repeated changes of the same line, e.g. when typing,
+    are collected as one single change.
+    """
+
+    def __init__(self):
+        self.scId = None
+        self._journal = None
+        self._deltas = []
+
+    def start(self, journal, scId, sectionContent):
+        """Start recording the changes of a loaded section.
+
+        Positional arguments:
+            journal: EditJournal -- The journal to write to.
+            scId: str -- Section ID.
+            sectionContent: str -- The section content the text
+                                   was loaded from.
+        """
+        self.stop()
+        self._journal = journal
+        self.scId = scId
+        self._deltas = []
+        journal.put({'section': scId, 'open': journal.get_crc(sectionContent)})
+        journal.add_recorder(self)
+
+    def rebase(self, sectionContent, lines):
+        """Record that the changes were applied to the section.
+
+        Positional arguments:
+            sectionContent: str -- The new section content.
+            lines: list of str -- The whole text, split into lines.
+
+        The text is not recorded, but the difference
+        between the prepared section content and the text.
+        """
+        if self.scId is None:
+            return
+
+        self.flush()
+        record = {
+            'section': self.scId,
+            'applied': self._journal.get_crc(sectionContent),
+        }
+        prepared = EditorBox.prepare_text(
+            sectionContent,
+            withTags=False,
+        )[0].split('\n')
+        if prepared != lines:
+            record['entry'] = [self._journal.get_delta(prepared, lines)]
+        self._journal.put(record)
+
+    def stop(self):
+        """Record the pending changes, and the end of the session."""
+        if self.scId is None:
+            return
+
+        self.flush()
+        self._journal.put({'section': self.scId, 'close': 1})
+        self._journal.remove_recorder(self)
+        self._journal = None
+        self.scId = None
+
+    def replace_lines(self, firstLine, lastLine, newLines):
+        """Record the replacement of the lines from firstLine to lastLine.
+
+        Positional arguments:
+            firstLine: int -- Number of the first changed line.
+            lastLine: int -- Number of the last changed line before the change.
+            newLines: list of str -- The text of the changed lines after
+                                     the change.
+        """
+        if self.scId is None:
+            return
+
+        if firstLine == lastLine and len(newLines) == 1 and self._deltas:
+            lastDelta = self._deltas[-1]
+            if (lastDelta[0] == firstLine
+                and lastDelta[1] == firstLine
+                and len(lastDelta[2]) == 1
+            ):
+                # The same line is changed again.
+                lastDelta[2] = newLines
+                return
+
+        self._deltas.append([firstLine, lastLine, newLines])
+
+    def flush(self):
+        """Pass the collected changes to the journal."""
+        if self._deltas:
+            self._journal.put({'section': self.scId, 'changes': self._deltas})
+            self._deltas = []
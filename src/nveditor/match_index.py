@@ -0,0 +1,156 @@
+"""Provide a class for indexing the search matches of the editor text.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+from nveditor.tag_tokenizer import get_text_spans
+
+
+class MatchIndex:
+    """Keep the matches of a search pattern up to date, line by line.
+
+    Public instance variables:
+        regex -- The compiled search pattern; None, if not searching.
+
+    Public methods:
+        set_pattern(regex, lines) -- Index all lines for a new pattern.
+        clear() -- Stop searching.
+        replace_lines(firstLine, lastLine, newLines) -- Update the matches.
+        find(lineNumber, column, backwards) -- Return the nearest match.
+        get_count() -- Return the number of matches.
+        get_line_numbers() -- Return the numbers of the lines with matches.
+        get_tag_indices(firstLine, lastLine) -- Return the match indices.
+        iter_matches(line) -- Generate the match objects of a line.
+
+    The matches are stored as lists of (start, end) column tuples
+    per line. Matches within XML tags, across tags, or across lines
+    are not indexed, so replacing them cannot break the markup.
+    """
+
+    def __init__(self):
+        self.regex = None
+        self._lineMatches = []
+        self._matchCount = 0
+
+    def set_pattern(self, regex, lines):
+        """Index all lines for a new search pattern.
+
+        Positional arguments:
+            regex: compiled regular expression -- The search pattern.
+            lines: list of str -- The whole text, split into lines.
+        """
+        self.regex = regex
+        self._lineMatches = [self._get_spans(line) for line in lines]
+        self._matchCount = sum(len(spans) for spans in self._lineMatches)
+
+    def clear(self):
+        """Stop searching and discard the index."""
+        self.regex = None
+        self._lineMatches = []
+        self._matchCount = 0
+
+    def replace_lines(self, firstLine, lastLine, newLines):
+        """Replace the matches of the lines from firstLine to lastLine.
+
+        Positional arguments:
+            firstLine: int -- Number of the first changed line.
+            lastLine: int -- Number of the last changed line before the change.
+            newLines: list of str -- The text of the changed lines after
+                                     the change.
+        """
+        if self.regex is None:
+            return
+
+        oldMatches = self._lineMatches[firstLine - 1:lastLine]
+        newMatches = [self._get_spans(line) for line in newLines]
+        self._lineMatches[firstLine - 1:lastLine] = newMatches
+        self._matchCount += (
+            sum(len(spans) for spans in newMatches)
+            - sum(len(spans) for spans in oldMatches)
+        )
+
+    def find(self, lineNumber, column, backwards=False):
+        """Return the match next to a position as (line, start, end) tuple.
+
+        Positional arguments:
+            lineNumber: int -- Line number of the search start.
+            column: int -- Column of the search start.
+
+        Optional arguments:
+            backwards: bool -- If True, search for the previous match.
+
+        Search forward for the first match starting at or after column,
+        or backward for the last match starting before column.
+        Wrap around at the end or the beginning of the text.
+        Return None if there are no matches.
+        """
+        if not self._matchCount:
+            return None
+
+        lineCount = len(self._lineMatches)
+        lineNumber = min(max(lineNumber, 1), lineCount)
+        for i in range(lineCount + 1):
+            if backwards:
+                currentLine = (lineNumber - 1 - i) % lineCount + 1
+                spans = reversed(self._lineMatches[currentLine - 1])
+            else:
+                currentLine = (lineNumber - 1 + i) % lineCount + 1
+                spans = self._lineMatches[currentLine - 1]
+            for start, end in spans:
+                if i == 0:
+                    if backwards and start >= column:
+                        continue
+
+                    if not backwards and start < column:
+                        continue
+
+                return currentLine, start, end
+
+        return None
+
+    def get_count(self):
+        """Return the number of matches."""
+        return self._matchCount
+
+    def get_line_numbers(self):
+        """Return a list with the numbers of the lines containing matches."""
+        return [
+            i for i, spans in enumerate(self._lineMatches, 1) if spans
+        ]
+
+    def get_tag_indices(self, firstLine=1, lastLine=None, lineOffset=0):
+        """Return a flat list of Tk text indices delimiting the matches.
+
+        Optional arguments:
+            firstLine: int -- Number of the first line to include.
+            lastLine: int -- Number of the last line to include.
+            lineOffset: int -- Number of lines above the widget's
+                               first line, if not all lines are loaded.
+
+        The list can be passed to one single tag_add() call.
+        """
+        if lastLine is None or lastLine > len(self._lineMatches):
+            lastLine = len(self._lineMatches)
+        indices = []
+        for lineNumber in range(firstLine, lastLine + 1):
+            widgetLine = lineNumber - lineOffset
+            for start, end in self._lineMatches[lineNumber - 1]:
+                indices.append(f'{widgetLine}.{start}')
+                indices.append(f'{widgetLine}.{end}')
+        return indices
+
+    def iter_matches(self, line):
+        """Generate the match objects of a line, skipping the XML tags."""
+        for start, end in get_text_spans(line):
+            for match in self.regex.finditer(line, start, end):
+                if match.end() > match.start():
+                    yield match
+
+    def _get_spans(self, line):
+        # Return a list of (start, end) tuples of the matches in line.
+        if self.regex.search(line) is None:
+            # Most lines have no matches; skip splitting them at the tags.
+            return []
+
+        return [match.span() for match in self.iter_matches(line)]
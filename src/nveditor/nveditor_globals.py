@@ -5,8 +5,9 @@ For further information see https://github.com/peter88213/nv_editor
 License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
 """
 from nveditor.nveditor_locale import _
+from nveditor.preferences import Preferences
 
-prefs = {}
+prefs = Preferences()
 
 FEATURE = _('Section Editor')
 ICON = 'editor'
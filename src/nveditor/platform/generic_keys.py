@@ -14,6 +14,7 @@ class GenericKeys:
     COPY = ('<Control-c>', f'{_("Ctrl")}-C')
     CREATE_SECTION = ('<Control-n>', f'{_("Ctrl")}-N')
     CUT = ('<Control-x>', f'{_("Ctrl")}-X')
+    FIND = ('<Control-f>', f'{_("Ctrl")}-F')
     PASTE = ('<Control-v>', f'{_("Ctrl")}-V')
     ITALIC = ('<Control-i>', f'{_("Ctrl")}-I')
     NEXT = ('<Control-Next>', f'{_("Ctrl")}-{_("PgDn")}')
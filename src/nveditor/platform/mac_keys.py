@@ -13,6 +13,7 @@ class MacKeys(GenericKeys):
     APPLY_CHANGES = ('<Command-s>', 'Cmd-S')
     BOLD = ('<Command-b>', 'Cmd-B')
     CREATE_SECTION = ('<Command-n>', 'Cmd-N')
+    FIND = ('<Command-f>', 'Cmd-F')
     ITALIC = ('<Command-i>', 'Cmd-I')
     NEXT = ('<Command-Next>', f'Cmd-{_("PgDn")}')
     PLAIN = ('<Command-m>', 'Cmd-M')
@@ -0,0 +1,60 @@
+"""Provide a dictionary class for the preferences.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+
+
+class Preferences(dict):
+    """A dictionary that keeps track of changed values.
+
+    Public methods:
+        add_change_listener(listener) -- Register a function to be called
+                                         when a value is changed.
+        has_changed() -- Return True if a value changed since the last reset.
+        reset_changed() -- Consider the current values as unchanged.
+
+    Setting an item to its current value is not a change.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._isChanged = False
+        self._changeListeners = []
+
+    def __setitem__(self, key, value):
+        if key in self and self[key] == value:
+            return
+
+        super().__setitem__(key, value)
+        self._on_change()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._on_change()
+
+    def update(self, *args, **kwargs):
+        """Set the items one by one, so as to detect changes.
+
+        Overrides the superclass method.
+        """
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def add_change_listener(self, listener):
+        """Register a function to be called when a value is changed."""
+        self._changeListeners.append(listener)
+
+    def has_changed(self):
+        """Return True if a value changed since the last reset."""
+        return self._isChanged
+
+    def reset_changed(self):
+        """Consider the current values as unchanged."""
+        self._isChanged = False
+
+    def _on_change(self):
+        self._isChanged = True
+        for listener in self._changeListeners:
+            listener()
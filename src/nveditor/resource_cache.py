@@ -0,0 +1,109 @@
+"""Provide a cache class for the fonts and colors of the editor windows.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+import os
+import sys
+from tkinter import font as tkFont
+
+from nveditor.nveditor_globals import ICON
+import tkinter as tk
+
+
+class ResourceCache:
+    """Fonts, icon, and colors shared by all editor windows.
+
+    Public methods:
+        add_listener(listener) -- Register a function to be called
+                                  when the style is changed.
+        remove_listener(listener) -- Unregister a style listener.
+        get_icon() -- Return the window icon.
+        get_style() -- Return the current style for EditorBox.set_style().
+        set_colors(foreground, background, xmlTagColor) -- Change the colors.
+        set_font(family, size) -- Change the font.
+
+    The fonts are created once per family and size, and kept,
+    so switching back and forth does not create new Tk fonts.
+    """
+
+    def __init__(self, root):
+        self._root = root
+        self._fonts = {}
+        # (regular, bold) font tuples by (family, size)
+        self._icon = None
+        self._isIconLoaded = False
+        self._listeners = []
+        self._fontKey = None
+        self._colors = None
+        self._style = None
+        # cached result of get_style()
+
+    def add_listener(self, listener):
+        """Register a function to be called when the style is changed."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unregister a style listener, if registered."""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def get_icon(self):
+        """Return the window icon; None, if not available."""
+        if not self._isIconLoaded:
+            self._isIconLoaded = True
+            try:
+                path = os.path.dirname(sys.argv[0])
+                if not path:
+                    path = '.'
+                self._icon = tk.PhotoImage(file=f'{path}/icons/{ICON}.png')
+            except:
+                self._icon = None
+        return self._icon
+
+    def get_style(self):
+        """Return the current style as a tuple.
+        
+        The tuple holds the font, the bold font for the XML tags,
+        and the foreground, background, and XML tag colors.
+        The colors and the font must be set before.
+        """
+        if self._style is None:
+            self._style = self._get_fonts(*self._fontKey) + self._colors
+        return self._style
+
+    def set_colors(self, foreground, background, xmlTagColor):
+        """Change the colors of all editor windows."""
+        colors = (foreground, background, xmlTagColor)
+        if colors != self._colors:
+            self._colors = colors
+            self._on_change()
+
+    def set_font(self, family, size):
+        """Change the font of all editor windows."""
+        if (family, size) != self._fontKey:
+            self._fontKey = (family, size)
+            self._on_change()
+
+    def _get_fonts(self, family, size):
+        # Return the (regular, bold) fonts, creating them if necessary.
+        if not (family, size) in self._fonts:
+            regularFont = tkFont.Font(
+                root=self._root,
+                family=family,
+                size=size,
+            )
+            boldFont = tkFont.Font(
+                root=self._root,
+                family=family,
+                size=size,
+                weight='bold',
+            )
+            self._fonts[(family, size)] = (regularFont, boldFont)
+        return self._fonts[(family, size)]
+
+    def _on_change(self):
+        self._style = None
+        for listener in self._listeners:
+            listener()
@@ -0,0 +1,78 @@
+"""Provide a class for replacing text in many section contents at once.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+from nveditor.tag_tokenizer import get_text_spans
+from nveditor.xml_validator import XmlValidator
+
+
+class SectionReplacer:
+    """Replace the matches of a pattern in section contents.
+
+    Public methods:
+        replace(content) -- Return the content with the matches replaced.
+        run(contents) -- Replace the matches in a set of section contents.
+
+    The replacer is initialized with a compiled regular expression
+    and a replacement text, in which backslash escapes are processed
+    as with re.sub(). Matches within XML tags or across tags are skipped.
+    The replacer does not access the model or the widgets,
+    so it can run in a worker thread.
+    """
+
+    def __init__(self, regex, replacement):
+        self._regex = regex
+        self._replacement = replacement
+
+    def replace(self, content):
+        """Return a (newContent, replacements) tuple."""
+        if not content or self._regex.search(content) is None:
+            # Most sections do not match; skip splitting them at the tags.
+            return content, 0
+
+        parts = []
+        start = 0
+        replacements = 0
+        for spanStart, spanEnd in get_text_spans(content):
+            for match in self._regex.finditer(content, spanStart, spanEnd):
+                if match.end() == match.start():
+                    continue
+
+                parts.append(content[start:match.start()])
+                parts.append(match.expand(self._replacement))
+                start = match.end()
+                replacements += 1
+        if not replacements:
+            return content, 0
+
+        parts.append(content[start:])
+        return ''.join(parts), replacements
+
+    def run(self, contents):
+        """Replace the matches in a set of section contents.
+
+        Positional arguments:
+            contents: dict -- Section contents by section ID.
+
+        Return a (changes, errors) tuple of dictionaries by section ID:
+            changes -- (newContent, replacements) tuples
+                       of the sections with well-formed results.
+            errors -- Error messages of the sections that would
+                      not be well-formed after replacing.
+        """
+        changes = {}
+        errors = {}
+        for scId, content in contents.items():
+            newContent, replacements = self.replace(content)
+            if not replacements:
+                continue
+
+            error = XmlValidator.get_parse_error([newContent])
+            if error is None:
+                changes[scId] = (newContent, replacements)
+            else:
+                issue, lineNumber, column = error
+                errors[scId] = f'{issue}: line {lineNumber} column {column}'
+        return changes, errors
@@ -0,0 +1,57 @@
+"""Provide functions for locating the XML tags in the editor text.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+import re
+
+XML_TAG = re.compile(r'<[^\n]*?>')
+XML_TAG_OR_NEWLINE = re.compile(r'<[^\n]*?>|\n')
+
+
+def get_tag_indices(text, firstLine=1):
+    """Return a flat list of Tk text indices delimiting the XML tags.
+    
+    Positional arguments:
+        text: str -- The text to scan.
+        
+    Optional arguments:
+        firstLine: int -- The line number of the text's first line.
+        
+    The text is scanned in a single regular expression pass.
+    The list contains (start, end) index pairs, so it can be passed 
+    to one single tag_add() call. 
+    """
+    indices = []
+    lineNumber = firstLine
+    lineStart = 0
+    for match in XML_TAG_OR_NEWLINE.finditer(text):
+        start, end = match.span()
+        if end - start == 1:
+            # Newline.
+            lineNumber += 1
+            lineStart = end
+        else:
+            indices.append(f'{lineNumber}.{start - lineStart}')
+            indices.append(f'{lineNumber}.{end - lineStart}')
+    return indices
+
+
+def get_text_spans(line):
+    """Return a list of (start, end) tuples delimiting the text between tags.
+    
+    Positional arguments:
+        line: str -- A single line of the editor text.
+        
+    Empty spans, e.g. between adjacent tags, are omitted.
+    """
+    spans = []
+    start = 0
+    for match in XML_TAG.finditer(line):
+        if match.start() > start:
+            spans.append((start, match.start()))
+        start = match.end()
+    if len(line) > start:
+        spans.append((start, len(line)))
+    return spans
@@ -0,0 +1,66 @@
+"""Provide a cache class for section texts prepared for display.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+from collections import OrderedDict
+
+
+class TextCache:
+    """A small LRU cache for prepared section texts.
+    
+    Public methods:
+        get(scId, content) -- Return the cached entry, if any.
+        put(scId, content, preparedText) -- Add an entry.
+        prune(sections) -- Remove the entries that have become invalid.
+
+    The entries are keyed by section ID. Each entry holds the
+    content it was prepared from, so a changed section content
+    never hits an outdated entry.
+    """
+
+    def __init__(self, maxSize=4):
+        self._maxSize = maxSize
+        self._entries = OrderedDict()
+        # (content, preparedText) tuples by section ID
+
+    def get(self, scId, content):
+        """Return the entry for scId with content, or None, if not cached."""
+        if not scId in self._entries:
+            return None
+
+        storedContent, preparedText = self._entries[scId]
+        if not self._is_same(storedContent, content):
+            return None
+
+        self._entries.move_to_end(scId)
+        return preparedText
+
+    def put(self, scId, content, preparedText):
+        """Add an entry; drop the least recently used one, if necessary."""
+        self._entries[scId] = (content, preparedText)
+        self._entries.move_to_end(scId)
+        while len(self._entries) > self._maxSize:
+            self._entries.popitem(last=False)
+
+    def prune(self, sections):
+        """Remove the entries of deleted or changed sections.
+        
+        Positional arguments:
+            sections: dict -- The novel's sections by section ID.
+        """
+        for scId, (storedContent, __) in list(self._entries.items()):
+            if (not scId in sections
+                or not self._is_same(
+                    storedContent,
+                    sections[scId].sectionContent,
+                )
+            ):
+                del self._entries[scId]
+
+    @staticmethod
+    def _is_same(storedContent, content):
+        # Compare the identity first, so an unchanged content
+        # is usually recognized without comparing the strings.
+        return storedContent is content or storedContent == content
@@ -0,0 +1,175 @@
+"""Provide a class for a line-based model of the editor text.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+from bisect import bisect_right
+
+
+class TextDocument:
+    """Hold the lines of the editor text, mirroring the widget.
+
+    Public methods:
+        replace_lines(firstLine, lastLine, newLines) -- Update the lines.
+        get_line(lineNumber) -- Return a single line.
+        get_line_count() -- Return the number of lines.
+        get_lines(firstLine, lastLine) -- Return a list of lines.
+        get_text(first, last) -- Return the text between two positions.
+        iter_chunks(lineCount) -- Generate the text in blocks of lines.
+        snapshot() -- Return a copy sharing the lines.
+
+    The lines are held in tuples of up to _BLOCK_SIZE lines.
+    A change replaces only the tuples of the changed lines,
+    so a snapshot copies the list of tuples, not the text.
+    The lines are located by bisecting the blocks' first line numbers.
+    """
+    _BLOCK_SIZE = 512
+
+    def __init__(self, blocks=None):
+        if blocks is None:
+            blocks = [('',)]
+        self._blocks = list(blocks)
+        self._blockStarts = None
+        # index of each block's first line; computed when needed
+        self._lineCount = None
+
+    def replace_lines(self, firstLine, lastLine, newLines):
+        """Replace the lines from firstLine to lastLine with newLines.
+
+        Positional arguments:
+            firstLine: int -- Number of the first changed line.
+            lastLine: int -- Number of the last changed line before the change.
+            newLines: list of str -- The text of the changed lines after
+                                     the change.
+        """
+        lineCount = self.get_line_count()
+        first = min(firstLine - 1, lineCount)
+        last = max(first, min(lastLine, lineCount))
+        if not self._blocks:
+            self._blocks = self._make_blocks(newLines)
+            self._reset_line_count()
+            return
+
+        firstBlock = self._locate(min(first, lineCount - 1))[0]
+        lastBlock = self._locate(min(max(first, last - 1), lineCount - 1))[0]
+        blockStart = self._blockStarts[firstBlock]
+        lines = []
+        for block in self._blocks[firstBlock:lastBlock + 1]:
+            lines.extend(block)
+        lines[first - blockStart:last - blockStart] = newLines
+        newBlocks = self._make_blocks(lines)
+        oldSizes = [
+            len(block) for block in self._blocks[firstBlock:lastBlock + 1]
+        ]
+        self._blocks[firstBlock:lastBlock + 1] = newBlocks
+        if oldSizes != [len(block) for block in newBlocks]:
+            self._reset_line_count()
+
+    def get_line(self, lineNumber):
+        """Return the line with the number lineNumber."""
+        blockIndex, lineIndex = self._locate(lineNumber - 1)
+        return self._blocks[blockIndex][lineIndex]
+
+    def get_line_count(self):
+        """Return the number of lines."""
+        if self._lineCount is None:
+            blockStarts = []
+            lineCount = 0
+            for block in self._blocks:
+                blockStarts.append(lineCount)
+                lineCount += len(block)
+            self._blockStarts = blockStarts
+            self._lineCount = lineCount
+        return self._lineCount
+
+    def get_lines(self, firstLine=1, lastLine=None):
+        """Return a list with the lines from firstLine to lastLine.
+
+        Optional arguments:
+            firstLine: int -- Number of the first line.
+            lastLine: int -- Number of the last line. Default: last line.
+        """
+        lineCount = self.get_line_count()
+        if lastLine is None or lastLine > lineCount:
+            lastLine = lineCount
+        if firstLine > lastLine:
+            return []
+
+        firstBlock, firstIndex = self._locate(firstLine - 1)
+        lastBlock, lastIndex = self._locate(lastLine - 1)
+        if firstBlock == lastBlock:
+            return list(self._blocks[firstBlock][firstIndex:lastIndex + 1])
+
+        lines = list(self._blocks[firstBlock][firstIndex:])
+        for block in self._blocks[firstBlock + 1:lastBlock]:
+            lines.extend(block)
+        lines.extend(self._blocks[lastBlock][:lastIndex + 1])
+        return lines
+
+    def get_text(self, first=None, last=None):
+        """Return the text between two positions.
+
+        Optional arguments:
+            first: (line, column) tuple -- Start position.
+                                           Default: beginning of the text.
+            last: (line, column) tuple -- End position.
+                                          Default: end of the text.
+
+        Line numbers start with 1, columns with 0.
+        """
+        if first is None:
+            first = (1, 0)
+        if last is None:
+            lines = self.get_lines(first[0])
+        else:
+            lines = self.get_lines(first[0], last[0])
+            if lines:
+                lines[-1] = lines[-1][:last[1]]
+        if lines:
+            lines[0] = lines[0][first[1]:]
+        return '\n'.join(lines)
+
+    def iter_chunks(self, lineCount):
+        """Generate the text in blocks of about lineCount lines.
+
+        Each block ends with a line break,
+        so the blocks can be fed to a parser one by one.
+        """
+        lines = []
+        for block in self._blocks:
+            lines.extend(block)
+            if len(lines) >= lineCount:
+                lines.append('')
+                yield '\n'.join(lines)
+                lines = []
+        if lines:
+            lines.append('')
+            yield '\n'.join(lines)
+
+    def snapshot(self):
+        """Return a copy of the document, sharing the lines.
+
+        The copy is not affected by later changes,
+        so it can be read by a worker thread.
+        """
+        return TextDocument(self._blocks)
+
+    def _locate(self, lineIndex):
+        # Return the block index and the index within the block
+        # of the line with the zero-based index lineIndex.
+        self.get_line_count()
+        blockIndex = bisect_right(self._blockStarts, lineIndex) - 1
+        return blockIndex, lineIndex - self._blockStarts[blockIndex]
+
+    def _make_blocks(self, lines):
+        # Return a list of tuples holding up to _BLOCK_SIZE lines each.
+        return [
+            tuple(lines[i:i + self._BLOCK_SIZE])
+            for i in range(0, len(lines), self._BLOCK_SIZE)
+        ]
+
+    def _reset_line_count(self):
+        # Make the block positions be computed when needed.
+        self._blockStarts = None
+        self._lineCount = None
@@ -0,0 +1,121 @@
+"""Provide a class for counting the words of the editor text.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+import re
+
+
+class WordCounter:
+    """Keep the word and character counts up to date, line by line.
+
+    Public methods:
+        replace_lines(firstLine, lastLine, newLines) -- Update the counts.
+        get_counts() -- Return the numbers of words and characters.
+        count(text) -- Return the numbers of words and characters of a text.
+
+    Since each line of the editor text holds a paragraph,
+    only the changed paragraphs are counted again.
+    Comments and notes may span several paragraphs,
+    so the following lines are counted again, if a change
+    opens or closes a comment or a note.
+    """
+    _ADDITIONAL_WORD_LIMITS = re.compile(r'--|—|–|</p>')
+    _NO_WORD_LIMITS = re.compile(
+        r'<note>.*?</note>|<comment>.*?</comment>|<.+?>'
+    )
+    _UNCLOSED_ELEMENT = re.compile(r'<(comment|note)>(?!.*?</\1>)')
+
+    def __init__(self):
+        self._lines = ['']
+        self._lineCounts = [(0, 0, None)]
+        # (words, characters, element left open) tuples
+        self._wordCount = 0
+        self._charCount = 0
+
+    def replace_lines(self, firstLine, lastLine, newLines):
+        """Count the words of the lines from firstLine to lastLine.
+
+        Positional arguments:
+            firstLine: int -- Number of the first changed line.
+            lastLine: int -- Number of the last changed line before the change.
+            newLines: list of str -- The text of the changed lines after
+                                     the change.
+        """
+        if firstLine > 1:
+            openElement = self._lineCounts[firstLine - 2][2]
+        else:
+            openElement = None
+        oldCounts = self._lineCounts[firstLine - 1:lastLine]
+        if oldCounts:
+            oldOpenElement = oldCounts[-1][2]
+        else:
+            oldOpenElement = openElement
+        newCounts = []
+        for line in newLines:
+            newCounts.append(self._count_line(line, openElement))
+            openElement = newCounts[-1][2]
+        self._lines[firstLine - 1:lastLine] = newLines
+        self._lineCounts[firstLine - 1:lastLine] = newCounts
+        self._update_totals(oldCounts, newCounts)
+
+        # Count the following lines again, as long as they start
+        # within another comment or note than before.
+        i = firstLine - 1 + len(newLines)
+        while openElement != oldOpenElement and i < len(self._lines):
+            oldCount = self._lineCounts[i]
+            newCount = self._count_line(self._lines[i], openElement)
+            self._lineCounts[i] = newCount
+            self._update_totals((oldCount,), (newCount,))
+            oldOpenElement = oldCount[2]
+            openElement = newCount[2]
+            i += 1
+
+    def get_counts(self):
+        """Return a (words, characters) tuple for the whole text."""
+        return self._wordCount, self._charCount
+
+    @classmethod
+    def count(cls, text):
+        """Return a (words, characters) tuple for text, ignoring the markup.
+
+        Comments and notes are not counted.
+        """
+        if not text:
+            return 0, 0
+
+        plainText = cls._NO_WORD_LIMITS.sub('', text)
+        characters = len(plainText) - plainText.count('\n')
+        text = cls._ADDITIONAL_WORD_LIMITS.sub(' ', text)
+        words = len(cls._NO_WORD_LIMITS.sub('', text).split())
+        return words, characters
+
+    @classmethod
+    def _count_line(cls, line, openElement):
+        # Return a (words, characters, openElement) tuple for a line.
+        # openElement is the name of the comment or note element
+        # left open at the end of the previous line, or None.
+        if openElement is not None:
+            end = line.find(f'</{openElement}>')
+            if end < 0:
+                return 0, 0, openElement
+
+            line = line[end + len(openElement) + 3:]
+        match = cls._UNCLOSED_ELEMENT.search(line)
+        if match is None:
+            openElement = None
+        else:
+            openElement = match.group(1)
+            line = line[:match.start()]
+        words, characters = cls.count(line)
+        return words, characters, openElement
+
+    def _update_totals(self, oldCounts, newCounts):
+        # Replace the old line counts by the new ones in the totals.
+        for words, characters, __ in oldCounts:
+            self._wordCount -= words
+            self._charCount -= characters
+        for words, characters, __ in newCounts:
+            self._wordCount += words
+            self._charCount += characters
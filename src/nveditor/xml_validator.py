@@ -0,0 +1,292 @@
+"""Provide a class for incremental XML well-formedness checking.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+import re
+
+from nvlib.model.xml.xml_filter import strip_illegal_characters
+import xml.etree.ElementTree as ET
+
+
+class XmlValidator:
+    """Keep track of the tag balance of the editor text, line by line.
+
+    Public methods:
+        replace_lines(firstLine, lastLine, newLines) -- Update the line states.
+        is_well_formed() -- Return the well-formedness of the whole text.
+        is_split_valid(lineNumber, head, tail) -- Check a split position.
+        get_parse_error(chunks) -- Parse a text given in chunks.
+
+    Each line's state is computed when the line changes, and is
+    one of the following:
+        BALANCED -- The line's tags are balanced.
+        (closes, opens) -- Tuples of the names of unmatched closing tags
+                           and of the unmatched opening tags.
+        MALFORMED -- The line has a mismatched end tag.
+        None -- The line has constructs that cannot be checked
+                line by line, e.g. comments, stray '<' or '&',
+                namespace prefixes, or characters that are not allowed
+                in XML.
+    The states of many lines changed at once, e.g. of a loaded text,
+    are computed when needed; until then, the line's text is kept.
+    """
+    BALANCED = ((), ())
+    MALFORMED = False
+    _DEFERRED_LINES = 100
+    # Number of changed lines from which computing the states is deferred.
+
+    _TOKEN = re.compile(
+        r'<(?P<close>/?)(?P<name>[A-Za-z_][A-Za-z0-9_.\-]*)'
+        r'(?P<attributes>(?:[ \t\r\n]+[A-Za-z_:][A-Za-z0-9_.:\-]*'
+        r'[ \t\r\n]*=[ \t\r\n]*'
+        r'(?:"[^<&"]*"|\'[^<&\']*\'))*)'
+        r'[ \t\r\n]*(?P<empty>/?)>'
+        r'|&(?:amp|lt|gt|quot|apos);'
+        r'|[<&]'
+        r'|\]\]>'
+    )
+    # Names are restricted to ASCII; other names require a full parse.
+    _ATTRIBUTE = re.compile(
+        r'([A-Za-z_:][A-Za-z0-9_.:\-]*)[ \t\r\n]*=[ \t\r\n]*'
+        r'(?:"[^"]*"|\'[^\']*\')'
+    )
+    _ILLEGAL_CHARACTER = re.compile(
+        '[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]'
+    )
+    # Characters outside the XML "Char" production.
+    _UNPREFIXED_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_.\-]*')
+
+    def __init__(self):
+        self._lineStates = [self.BALANCED]
+        self._unbalancedLines = 0
+        self._pendingLines = 0
+        # number of lines whose states are not computed yet
+
+    def replace_lines(self, firstLine, lastLine, newLines):
+        """Replace the states of the lines from firstLine to lastLine.
+
+        Positional arguments:
+            firstLine: int -- Number of the first changed line.
+            lastLine: int -- Number of the last changed line before the change.
+            newLines: list of str -- The text of the changed lines after
+                                     the change.
+        """
+        oldStates = self._lineStates[firstLine - 1:lastLine]
+        if len(newLines) >= self._DEFERRED_LINES:
+            newStates = list(newLines)
+        else:
+            newStates = [self.get_line_state(line) for line in newLines]
+        self._lineStates[firstLine - 1:lastLine] = newStates
+        self._unbalancedLines += (
+            self._count_unbalanced(newStates)
+            - self._count_unbalanced(oldStates)
+        )
+        self._pendingLines += (
+            self._count_pending(newStates)
+            - self._count_pending(oldStates)
+        )
+
+    def is_well_formed(self):
+        """Return True if the text is well-formed, False if it is not.
+
+        Return None if a full XML parse is required to decide.
+        """
+        self._compute_pending()
+        if not self._unbalancedLines:
+            return True
+
+        return self.fold_states(self._lineStates)
+
+    def is_split_valid(self, lineNumber, head, tail):
+        """Return True if a split results in two well-formed parts.
+
+        Positional arguments:
+            lineNumber: int -- Number of the line with the split position.
+            head: str -- Text of the line before the split position.
+            tail: str -- Text of the line after the split position.
+
+        Return False, if at least one of the parts is not well-formed.
+        Return None if a full XML parse is required to decide.
+        """
+        self._compute_pending()
+        headResult = self.fold_states(
+            self._lineStates[:lineNumber - 1] + [self.get_line_state(head)]
+        )
+        if headResult is self.MALFORMED:
+            return False
+
+        tailResult = self.fold_states(
+            [self.get_line_state(tail)] + self._lineStates[lineNumber:]
+        )
+        if tailResult is self.MALFORMED:
+            return False
+
+        if headResult is None or tailResult is None:
+            return None
+
+        return True
+
+    @classmethod
+    def fold_states(cls, lineStates):
+        """Return True if the lineStates sequence is well-formed.
+
+        Return False if not, or None if a full XML parse is required.
+        """
+        openTags = []
+        for state in lineStates:
+            if state is cls.BALANCED:
+                continue
+
+            if state is None:
+                return None
+
+            if state is cls.MALFORMED:
+                return False
+
+            closes, opens = state
+            for name in closes:
+                if not openTags or openTags.pop() != name:
+                    return False
+
+            openTags.extend(opens)
+        return not openTags
+
+    @staticmethod
+    def get_parse_error(chunks):
+        """Parse a text given as a sequence of chunks as element content.
+
+        Positional arguments:
+            chunks: iterable of str -- The text, e.g. in blocks of lines.
+
+        Stop at the first error and return an (issue, line, column) tuple.
+        Return None if the text is well-formed.
+        The chunks are fed to the parser one by one. A parser target
+        without handler methods prevents building an element tree.
+        """
+        parser = ET.XMLParser(target=object())
+        lineNumber = 1
+        try:
+            parser.feed('<a>')
+            for chunk in chunks:
+                chunk = strip_illegal_characters(chunk)
+                try:
+                    parser.feed(chunk)
+                except UnicodeEncodeError as ex:
+                    # Unpaired surrogates cannot be passed to the parser.
+                    head = chunk[:ex.start]
+                    lineNumber += head.count('\n')
+                    column = len(head) - head.rfind('\n') - 1
+                    issue = 'not well-formed (invalid token)'
+                    return issue, lineNumber, column
+
+                lineNumber += chunk.count('\n')
+            parser.feed('</a>')
+            parser.close()
+        except ET.ParseError as ex:
+            issue = str(ex).split(':')[0]
+            lineNumber, column = ex.position
+            if lineNumber == 1:
+                # Do not count the enclosing element's start tag.
+                column -= len('<a>')
+            return issue, lineNumber, column
+
+        return None
+
+    @classmethod
+    def get_line_state(cls, line):
+        """Return the tag balance state of a single line."""
+        line = strip_illegal_characters(line)
+        if cls._ILLEGAL_CHARACTER.search(line):
+            return None
+
+        closes = []
+        opens = []
+        for match in cls._TOKEN.finditer(line):
+            token = match.group()
+            if token[0] == '&':
+                if len(token) == 1:
+                    return None
+
+                continue
+
+            name = match.group('name')
+            if name is None:
+                # Stray '<' or "]]>".
+                return None
+
+            attributes = match.group('attributes')
+            if match.group('empty'):
+                if match.group('close'):
+                    return None
+
+                if attributes and not cls._has_valid_attributes(attributes):
+                    return None
+
+                continue
+
+            if match.group('close'):
+                if attributes:
+                    return None
+
+                if opens:
+                    if opens.pop() != name:
+                        return cls.MALFORMED
+
+                else:
+                    closes.append(name)
+            else:
+                if attributes and not cls._has_valid_attributes(attributes):
+                    return None
+
+                opens.append(name)
+        if not closes and not opens:
+            return cls.BALANCED
+
+        return (tuple(closes), tuple(opens))
+
+    def _compute_pending(self):
+        # Compute the states of the lines kept as text.
+        if not self._pendingLines:
+            return
+
+        for i, state in enumerate(self._lineStates):
+            if isinstance(state, str):
+                self._lineStates[i] = self.get_line_state(state)
+        self._pendingLines = 0
+        self._unbalancedLines = self._count_unbalanced(self._lineStates)
+
+    @staticmethod
+    def _count_pending(lineStates):
+        return sum(isinstance(state, str) for state in lineStates)
+
+    @classmethod
+    def _count_unbalanced(cls, lineStates):
+        return (
+            len(lineStates)
+            - lineStates.count(cls.BALANCED)
+            - cls._count_pending(lineStates)
+        )
+
+    @classmethod
+    def _has_valid_attributes(cls, attributes):
+        # Return True if the attribute names are unique,
+        # and if their namespace prefixes need no declaration.
+        # Namespace declarations are left to the full parse,
+        # because they can bind prefixes used on other lines.
+        names = []
+        for name in cls._ATTRIBUTE.findall(attributes):
+            if ':' in name:
+                prefix, localName = name.split(':', 1)
+                if prefix != 'xml':
+                    return False
+
+                if not cls._UNPREFIXED_NAME.fullmatch(localName):
+                    return False
+
+            elif name == 'xmlns':
+                return False
+
+            names.append(name)
+        return len(names) == len(set(names))
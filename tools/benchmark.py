@@ -0,0 +1,269 @@
+"""Measure the editor latencies on a machine with a display.
+
+Usage: python benchmark.py
+
+The script is run from the tools directory, like the build script.
+It expects the novelibre repository beside the nv_editor repository.
+The user's configuration and journal are not touched.
+
+Measured:
+    - Keystroke latency, depending on the section length.
+    - Navigation latency, stepping through a 2000-section novel.
+    - Opening latency of an editor window, with and without the pool.
+
+Copyright (c) Peter Triesberger
+For further information see https://github.com/peter88213/nv_editor
+License: GNU GPLv3 (https://www.gnu.org/licenses/gpl-3.0.en.html)
+"""
+import os
+from statistics import median
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, f'{os.getcwd()}/../src')
+sys.path.insert(0, f'{os.getcwd()}/../../novelibre/src')
+from nveditor.editor_box import EditorBox
+from nveditor.editor_service import EditorService
+from nveditor.nveditor_globals import prefs
+import tkinter as tk
+
+PARAGRAPH = (
+    '<p>The quick brown fox jumps over the lazy dog, '
+    '<em>and the dog does not even look up</em>. '
+    'Then the fox runs away.</p>'
+)
+KEYSTROKES = 200
+SECTION_LENGTHS = (100, 1000, 10000)
+# Paragraphs per section for the keystroke benchmark.
+NOVEL_SECTIONS = 2000
+NOVEL_SECTION_LENGTH = 30
+# Paragraphs per section for the navigation benchmark.
+POOL_SIZE = 1
+
+
+class Configuration:
+    """Stand-in for the novelibre configuration; not saved."""
+
+    def __init__(self, settings={}, options={}, filePath=None):
+        self.settings = dict(settings)
+        self.options = dict(options)
+
+    def read(self):
+        pass
+
+    def write(self, iniFile=None):
+        pass
+
+
+class NvService:
+    """Stand-in for the novelibre service factory."""
+
+    def new_configuration(self, **kwargs):
+        return Configuration(**kwargs)
+
+
+class Section:
+    """Stand-in for a novelibre section."""
+
+    def __init__(self, title, sectionContent):
+        self.title = title
+        self.sectionContent = sectionContent
+        self.scType = 0
+        self.scene = 0
+        self.status = 1
+        self.viewpoint = None
+
+
+class Novel:
+    """Stand-in for the novelibre novel."""
+
+    def __init__(self, sectionCount, sectionLength):
+        self.title = 'Benchmark'
+        self.chapters = {}
+        self.tree = None
+        self.sections = {}
+        for i in range(1, sectionCount + 1):
+            self.sections[f'sc{i}'] = Section(
+                f'Section {i}',
+                make_text(sectionLength),
+            )
+
+
+class Model:
+    """Stand-in for the novelibre model."""
+
+    def __init__(self, novel):
+        self.novel = novel
+        self.prjFile = None
+        self.nvService = NvService()
+
+    def add_observer(self, client):
+        pass
+
+
+class Tree:
+    """Stand-in for the novelibre project tree, holding only sections."""
+
+    def __init__(self, novel):
+        self._nodes = list(novel.sections)
+
+    def go_to_node(self, node):
+        pass
+
+    def next_node(self, node):
+        i = self._nodes.index(node) + 1
+        if i < len(self._nodes):
+            return self._nodes[i]
+
+        return ''
+
+    def prev_node(self, node):
+        i = self._nodes.index(node) - 1
+        if i >= 0:
+            return self._nodes[i]
+
+        return ''
+
+
+class View:
+    """Stand-in for the novelibre main view."""
+
+    def __init__(self, root, novel):
+        self.root = root
+        self.tv = Tree(novel)
+        self.selectedNode = None
+
+    def ask_yes_no(self, *args, **kwargs):
+        return True
+
+    def show_error(self, *args, **kwargs):
+        pass
+
+    def show_info(self, *args, **kwargs):
+        pass
+
+
+class Controller:
+    """Stand-in for the novelibre controller."""
+    isLocked = False
+
+    def open_help(self, *args, **kwargs):
+        pass
+
+
+def make_text(paragraphs):
+    """Return a section content with the given number of paragraphs."""
+    return '\n'.join([PARAGRAPH] * paragraphs)
+
+
+def make_service(root, configDir, sectionCount, sectionLength, poolSize):
+    """Return an editor service for a generated novel."""
+    model = Model(Novel(sectionCount, sectionLength))
+    view = View(root, model.novel)
+    service = EditorService(model, view, Controller())
+    service._configDir = configDir
+    # Keep the journal away from the user's configuration.
+    prefs['pool_size'] = poolSize
+    return service, view
+
+
+def report(title, times):
+    """Print the median and the maximum of a list of durations."""
+    print(
+        f'{title:<40} '
+        f'median {median(times) * 1000:8.2f} ms   '
+        f'max {max(times) * 1000:8.2f} ms'
+    )
+
+
+def benchmark_keystrokes(root):
+    """Measure typing, depending on the section length."""
+    for paragraphs in SECTION_LENGTHS:
+        box = EditorBox(root, undo=True)
+        box.pack()
+        box.set_text(make_text(paragraphs))
+        box.mark_set('insert', '1.3')
+        root.update()
+        times = []
+        for i in range(KEYSTROKES):
+            start = perf_counter()
+            box.insert('insert', 'x')
+            box.colorize()
+            root.update_idletasks()
+            times.append(perf_counter() - start)
+        report(f'Keystroke, {paragraphs} paragraphs', times)
+        box.destroy()
+        box.frame.destroy()
+
+
+def benchmark_navigation(root, configDir):
+    """Measure stepping through a large novel with "Next"."""
+    service, view = make_service(
+        root,
+        configDir,
+        NOVEL_SECTIONS,
+        NOVEL_SECTION_LENGTH,
+        0,
+    )
+    view.selectedNode = 'sc1'
+    service.open_editor_window()
+    root.update()
+    editor = service._sectionEditors['sc1']
+    times = []
+    for i in range(NOVEL_SECTIONS - 1):
+        start = perf_counter()
+        editor._load_next()
+        root.update_idletasks()
+        times.append(perf_counter() - start)
+        root.update()
+        # Let the prefetching run outside the measurement,
+        # as it does between keystrokes.
+    report(f'Next section, {NOVEL_SECTIONS} sections', times)
+    service.on_close()
+    service.on_quit()
+
+
+def benchmark_pool(root, configDir):
+    """Measure opening a second editor window, with and without the pool.
+    
+    The pool is filled after the first editor window is opened,
+    so the first window is built on demand in both cases.
+    """
+    for poolSize in (0, POOL_SIZE):
+        times = []
+        for i in range(5):
+            service, view = make_service(
+                root,
+                configDir,
+                10,
+                NOVEL_SECTION_LENGTH,
+                poolSize,
+            )
+            view.selectedNode = 'sc1'
+            service.open_editor_window()
+            root.update()
+            while len(service._viewPool) < poolSize:
+                root.update()
+            view.selectedNode = 'sc2'
+            start = perf_counter()
+            service.open_editor_window()
+            root.update_idletasks()
+            times.append(perf_counter() - start)
+            service.on_close()
+            service.on_quit()
+        report(f'Second open, pool size {poolSize}', times)
+
+
+def main():
+    root = tk.Tk()
+    root.withdraw()
+    with TemporaryDirectory() as configDir:
+        benchmark_keystrokes(root)
+        benchmark_navigation(root, configDir)
+        benchmark_pool(root, configDir)
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()